@@ -0,0 +1,593 @@
+"""
+Benchmark every challenge generator and solver on synthetic inputs, and compare
+the results against a saved baseline to catch regressions before a competition
+build.
+
+What's covered:
+
+- re/lol: `LOLFile.from_chunks`, `LOLFile.write_from_file` and
+  `LOLFile.undo_lol_file`, sweeping the -l/-u chunk sizes
+- crypto/entwistion: `entwist()` and `entwist_file()` from entwistion-dev.py, and
+  `stt.Untwister.get_random()`, sweeping the number of submissions (with and
+  without the untempering fast path)
+- digital-forensics/spare-tire: create_flag.py and solve.py, sweeping the block
+  size
+
+The inputs are random bytes from a seeded generator (1 KiB to 1 GiB by default),
+so every run measures the same thing. Each case runs in a fresh process, so that
+the peak memory of one doesn't hide the next, and records its wall time, peak RSS
+and throughput.
+
+    python bench_suite.py --json baseline.json
+    python bench_suite.py --sizes 1K 1M --only "lol.*" --baseline baseline.json
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from challenges import REPO_ROOT, import_challenge
+
+DEFAULT_SIZES = ["1K", "1M", "64M", "1G"]
+
+# (-l, -u) pairs for the .lol benchmarks; the first is lol.py's default
+DEFAULT_CHUNK_SIZES = ["1024:10240", "64:640", "65536:655360"]
+
+# Submissions for Untwister with fully-known outputs (solved by untempering), and
+# for the same thing forced through Z3, which is far slower
+DEFAULT_SUBMISSIONS = [624, 6240, 62400]
+DEFAULT_Z3_SUBMISSIONS = [624, 1248]
+
+DEFAULT_BLOCK_SIZES = [2**16, 4 * 2**20]
+
+# A case only counts as a regression if it's this much worse than the baseline...
+DEFAULT_TOLERANCE = 0.25
+# ...and slower by more than this many seconds, since tiny timings are mostly noise
+DEFAULT_MIN_SECONDS = 0.05
+# ...or uses more than this many MB more memory
+DEFAULT_MIN_RSS_MB = 16
+
+SIZE_SUFFIXES = {"K": 2**10, "M": 2**20, "G": 2**30}
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a size like "4096", "1K", "64M" or "1G" (binary units) into bytes.
+    """
+    suffix = size[-1:].upper()
+    if suffix in SIZE_SUFFIXES:
+        return int(size[:-1]) * SIZE_SUFFIXES[suffix]
+    return int(size)
+
+
+def parse_chunk_sizes(chunk_sizes: str) -> Tuple[int, int]:
+    """
+    Parse a "min:max" pair of .lol chunk sizes.
+    """
+    min_chunk_size, max_chunk_size = (parse_size(size) for size in chunk_sizes.split(":"))
+    return min_chunk_size, max_chunk_size
+
+
+def _max_rss_mb() -> float:
+    # On Linux, ru_maxrss carries over from the parent process across exec(), so
+    # small cases would report the peak of whatever spawned them. The high-water
+    # mark in /proc is just this process's.
+    try:
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+
+    # ru_maxrss is in kilobytes on Linux, but bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+class Timer:
+    """
+    Times the code in a `with` block, and how much the peak RSS grew during it.
+    """
+
+    def __init__(self):
+        self.seconds = None
+        self.rss_before = None
+
+    def __enter__(self) -> "Timer":
+        self.rss_before = _max_rss_mb()
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.seconds = perf_counter() - self.start
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Hide what the challenge scripts print.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_lol_from_chunks(
+    timer: Timer,
+    input_file: Path,
+    work_dir: Path,
+    min_chunk_size: int,
+    max_chunk_size: int,
+    seed: int,
+    **_,
+) -> int:
+    lol = import_challenge("re/lol", "lol")
+    raw_chunks = lol.LOLFile.get_raw_chunks_from_file(
+        input_file, min_chunk_size, max_chunk_size, seed
+    )
+    with timer:
+        lol.LOLFile.from_chunks(raw_chunks, seed)
+    return input_file.stat().st_size
+
+
+def bench_lol_write_from_file(
+    timer: Timer,
+    input_file: Path,
+    work_dir: Path,
+    min_chunk_size: int,
+    max_chunk_size: int,
+    seed: int,
+    **_,
+) -> int:
+    lol = import_challenge("re/lol", "lol")
+    with timer:
+        lol.LOLFile.write_from_file(
+            input_file, work_dir / "output.lol", min_chunk_size, max_chunk_size, seed
+        )
+    return input_file.stat().st_size
+
+
+def bench_lol_undo_lol_file(
+    timer: Timer,
+    input_file: Path,
+    work_dir: Path,
+    min_chunk_size: int,
+    max_chunk_size: int,
+    seed: int,
+    **_,
+) -> int:
+    lol = import_challenge("re/lol", "lol")
+    lol_path = work_dir / "input.lol"
+    lol.LOLFile.write_from_file(input_file, lol_path, min_chunk_size, max_chunk_size, seed)
+    with timer:
+        # Memory-maps the file and passes it to undo_lol_file()
+        reconstructed = lol.LOLFile.undo_lol_path(lol_path)
+    if len(reconstructed) != input_file.stat().st_size:
+        raise RuntimeError("undo_lol_file() gave back the wrong number of bytes")
+    return len(reconstructed)
+
+
+def bench_entwist(timer: Timer, input_file: Path, work_dir: Path, seed: int, **_) -> int:
+    entwistion = import_challenge("crypto/entwistion", "entwistion-dev")
+    random.seed(seed)
+    with timer, quiet():
+        entwistion.entwist(input_file)
+    return input_file.stat().st_size
+
+
+def bench_entwist_file(timer: Timer, input_file: Path, work_dir: Path, seed: int, **_) -> int:
+    entwistion = import_challenge("crypto/entwistion", "entwistion-dev")
+    random.seed(seed)
+    with timer, quiet():
+        entwistion.entwist_file(input_file, work_dir / "output.twist")
+    return input_file.stat().st_size
+
+
+def bench_untwister(
+    timer: Timer,
+    input_file: Optional[Path],
+    work_dir: Path,
+    submissions: int,
+    fast_path: bool,
+    seed: int,
+    **_,
+) -> int:
+    stt = import_challenge("crypto/entwistion", "stt")
+    source = random.Random(seed)
+
+    ut = stt.Untwister(fast_path=fast_path)
+    for _ in range(submissions):
+        ut.submit(bin(source.getrandbits(32))[2:])
+
+    with timer:
+        r = ut.get_random(portfolio=1)
+
+    if r.getrandbits(32) != source.getrandbits(32):
+        raise RuntimeError("Untwister recovered the wrong state")
+    return submissions
+
+
+def bench_create_flag(timer: Timer, input_file: Path, work_dir: Path, block_size: int, **_) -> int:
+    create_flag = import_challenge("digital-forensics/spare-tire", "create_flag")
+
+    # create_flag.py writes its output next to its input
+    link = work_dir / "input.bin"
+    link.symlink_to(input_file)
+    with timer, quiet():
+        create_flag.main(argparse.Namespace(input_file=link, block_size=block_size))
+    return input_file.stat().st_size
+
+
+def bench_solve_tire(timer: Timer, input_file: Path, work_dir: Path, block_size: int, **_) -> int:
+    solve = import_challenge("digital-forensics/spare-tire", "solve")
+    bitshift = import_challenge("digital-forensics/spare-tire", "bitshift")
+
+    tire_path = work_dir / "input.bin.tire"
+    bitshift.shift_file(input_file, tire_path, 1)
+    args = argparse.Namespace(
+        input_file=tire_path,
+        detect=False,
+        max_shift=7,
+        output_dir=None,
+        block_size=block_size,
+    )
+    with timer, quiet():
+        solve.main(args)
+    return input_file.stat().st_size
+
+
+class Benchmark(NamedTuple):
+    function: Callable[..., int]
+    # What the function returns the number of, for the throughput
+    unit: str
+    # Whether it runs on a synthetic input file
+    takes_input: bool = True
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "lol.from_chunks": Benchmark(bench_lol_from_chunks, "bytes"),
+    "lol.write_from_file": Benchmark(bench_lol_write_from_file, "bytes"),
+    "lol.undo_lol_file": Benchmark(bench_lol_undo_lol_file, "bytes"),
+    "entwistion.entwist": Benchmark(bench_entwist, "bytes"),
+    "entwistion.entwist_file": Benchmark(bench_entwist_file, "bytes"),
+    "stt.get_random": Benchmark(bench_untwister, "submissions", takes_input=False),
+    "spare-tire.create_flag": Benchmark(bench_create_flag, "bytes"),
+    "spare-tire.solve": Benchmark(bench_solve_tire, "bytes"),
+}
+
+
+class Case(NamedTuple):
+    benchmark: str
+    params: Dict[str, Any]
+
+    @property
+    def key(self) -> str:
+        """
+        What identifies the same case in a baseline.
+        """
+        return self.benchmark + json.dumps(self.params, sort_keys=True)
+
+    def describe(self) -> str:
+        return ", ".join(f"{name}={value}" for name, value in self.params.items())
+
+
+def get_cases(args: argparse.Namespace) -> List[Case]:
+    """
+    Every combination of the parameters to sweep, for every benchmark.
+    """
+    cases = []
+    for size in args.sizes:
+        for min_chunk_size, max_chunk_size in args.chunk_sizes:
+            for name in ("lol.from_chunks", "lol.write_from_file", "lol.undo_lol_file"):
+                params = {"min_chunk_size": min_chunk_size, "max_chunk_size": max_chunk_size}
+                cases.append(Case(name, {"size": size, **params, "seed": args.seed}))
+
+        for name in ("entwistion.entwist", "entwistion.entwist_file"):
+            cases.append(Case(name, {"size": size, "seed": args.seed}))
+
+        for block_size in args.block_sizes:
+            for name in ("spare-tire.create_flag", "spare-tire.solve"):
+                cases.append(Case(name, {"size": size, "block_size": block_size}))
+
+    for fast_path, counts in ((True, args.submissions), (False, args.z3_submissions)):
+        for submissions in counts:
+            params = {"submissions": submissions, "fast_path": fast_path, "seed": args.seed}
+            cases.append(Case("stt.get_random", params))
+
+    return [
+        case
+        for case in cases
+        if any(fnmatch.fnmatch(case.benchmark, pattern) for pattern in args.only)
+    ]
+
+
+def make_synthetic_file(path: Path, size: int, seed: int = 0) -> None:
+    """
+    Write `size` random bytes to `path`, a block at a time.
+    """
+    rng = np.random.default_rng(seed)
+    with open(path, "wb") as fp:
+        for start in range(0, size, 2**24):
+            fp.write(rng.integers(0, 256, min(2**24, size - start), dtype=np.uint8).tobytes())
+
+
+def run_case(case: Case, input_file: Optional[Path], work_dir: Path) -> Dict:
+    """
+    Run one case (in a fresh process) and measure it.
+    """
+    benchmark = BENCHMARKS[case.benchmark]
+    timer = Timer()
+    units = benchmark.function(timer, input_file, work_dir, **case.params)
+    if timer.seconds is None:
+        raise RuntimeError(f"{case.benchmark} didn't time anything")
+
+    return {
+        "seconds": timer.seconds,
+        "units": units,
+        "unit": benchmark.unit,
+        "per_second": units / timer.seconds if timer.seconds else None,
+        "peak_rss_mb": _max_rss_mb(),
+        "peak_rss_growth_mb": _max_rss_mb() - timer.rss_before,
+    }
+
+
+def run_isolated(case: Case, input_file: Optional[Path], work_dir: Path) -> Dict:
+    """
+    Run a case in its own process, recording an error rather than stopping if it
+    fails (or gets killed for running out of memory).
+    """
+    work_dir.mkdir()
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(1, mp_context=ctx) as executor:
+            return executor.submit(run_case, case, input_file, work_dir).result()
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def get_environment() -> Dict:
+    """
+    What the results were measured on, since they're only comparable with
+    results from the same kind of machine.
+    """
+    environment = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    try:
+        environment["commit"] = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        environment["commit"] = None
+    return environment
+
+
+def format_result(result: Dict) -> str:
+    if "error" in result:
+        return f"failed ({result['error']})"
+
+    if result["unit"] == "bytes":
+        throughput = f"{result['per_second'] / 2**20:10.1f} MB/s"
+    else:
+        throughput = f"{result['per_second']:10.1f} {result['unit']}/s"
+    return (
+        f"{result['seconds']:9.3f}s, {throughput}, "
+        f"peak RSS {result['peak_rss_mb']:8.1f} MB (+{result['peak_rss_growth_mb']:.1f})"
+    )
+
+
+def compare(result: Dict, baseline: Dict, args: argparse.Namespace) -> List[str]:
+    """
+    Work out how a result compares to its baseline.
+
+    :returns: A description of each way that it's regressed.
+    """
+    if "error" in result:
+        return [] if "error" in baseline else ["now fails"]
+    if "error" in baseline:
+        return []
+
+    regressions = []
+    seconds, base_seconds = result["seconds"], baseline["seconds"]
+    if seconds > base_seconds * (1 + args.tolerance) and seconds - base_seconds > args.min_seconds:
+        regressions.append(f"{seconds / base_seconds:.2f}x slower")
+
+    rss, base_rss = result["peak_rss_mb"], baseline["peak_rss_mb"]
+    if rss > base_rss * (1 + args.tolerance) and rss - base_rss > args.min_rss_mb:
+        regressions.append(f"{rss / base_rss:.2f}x peak RSS")
+
+    return regressions
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Sizes of synthetic input, like 4096, 1K, 64M or 1G (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--chunk-sizes",
+        nargs="+",
+        default=DEFAULT_CHUNK_SIZES,
+        help="min:max .lol chunk sizes to sweep (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--submissions",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SUBMISSIONS,
+        help="Numbers of fully-known outputs to give Untwister (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--z3-submissions",
+        type=int,
+        nargs="*",
+        default=DEFAULT_Z3_SUBMISSIONS,
+        help="The same, but solved with Z3 instead of untempering (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--block-sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_BLOCK_SIZES,
+        help="Block sizes for spare-tire (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        default=["*"],
+        help=f"Only run benchmarks matching these patterns, out of: {', '.join(BENCHMARKS)}.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed for the synthetic inputs and the generators (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Run each case this many times and keep the fastest (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Where to put the synthetic inputs and outputs (default: a temporary directory).",
+    )
+
+    parser.add_argument("--json", type=Path, help="Write the results to this file.")
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="Compare against the results (from --json) of an earlier run, and exit "
+        "with an error if anything has regressed.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="How much slower or bigger than the baseline counts as a regression, "
+        "as a fraction (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=DEFAULT_MIN_SECONDS,
+        help="Ignore slowdowns smaller than this (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--min-rss-mb",
+        type=float,
+        default=DEFAULT_MIN_RSS_MB,
+        help="Ignore memory growth smaller than this (default: %(default)s).",
+    )
+
+    args = parser.parse_args()
+    args.sizes = [parse_size(size) for size in args.sizes]
+    args.chunk_sizes = [parse_chunk_sizes(sizes) for sizes in args.chunk_sizes]
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    return args
+
+
+def main(args: argparse.Namespace) -> None:
+    cases = get_cases(args)
+    if not cases:
+        print(f"Nothing matches {args.only}")
+        sys.exit(1)
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as fp:
+            saved = json.load(fp)
+        baseline = {result["key"]: result for result in saved["results"]}
+
+        environment = get_environment()
+        for name in ("machine", "cpu_count", "python"):
+            if saved["environment"].get(name) != environment[name]:
+                print(f"Warning: the baseline was run with a different {name}")
+
+    with contextlib.ExitStack() as stack:
+        if args.work_dir is None:
+            work_dir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        else:
+            work_dir = args.work_dir
+            work_dir.mkdir(parents=True, exist_ok=True)
+
+        width = max(len(case.describe()) for case in cases)
+        inputs = {}
+        results = []
+        regressed = False
+        for case in cases:
+            input_file = None
+            if BENCHMARKS[case.benchmark].takes_input:
+                size = case.params["size"]
+                if size not in inputs:
+                    inputs[size] = work_dir / f"synthetic-{size}-{args.seed}.bin"
+                    if not inputs[size].exists():
+                        make_synthetic_file(inputs[size], size, args.seed)
+                input_file = inputs[size]
+
+            runs = [
+                run_isolated(case, input_file, work_dir / f"case-{len(results)}-{i}")
+                for i in range(args.repeat)
+            ]
+            succeeded = [run for run in runs if "error" not in run]
+            result = min(succeeded, key=lambda run: run["seconds"]) if succeeded else runs[0]
+            result = {"benchmark": case.benchmark, "params": case.params, "key": case.key, **result}
+            if args.repeat > 1:
+                result["all_seconds"] = [run.get("seconds") for run in runs]
+            results.append(result)
+
+            line = f"{case.benchmark:<24} {case.describe():<{width}} {format_result(result)}"
+            if case.key in baseline:
+                regressions = compare(result, baseline[case.key], args)
+                if regressions:
+                    regressed = True
+                    line += "  REGRESSION: " + ", ".join(regressions)
+                elif "error" not in result and "error" not in baseline[case.key]:
+                    line += f"  ({result['seconds'] / baseline[case.key]['seconds']:.2f}x baseline)"
+            print(line)
+
+    if args.json is not None:
+        with open(args.json, "w") as fp:
+            json.dump({"environment": get_environment(), "results": results}, fp, indent=2)
+
+    if regressed:
+        print("Some benchmarks regressed against the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(get_args())
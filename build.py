@@ -0,0 +1,621 @@
+"""
+Build the challenge artifacts (the files handed out to players) from their
+sources, skipping anything that's already up to date.
+
+Every step has a key: a SHA-256 of everything that goes into it, which is the
+source of the scripts it runs, the contents of its input files (including the
+outputs of any step it depends on) and its parameters, like seeds and chunk
+sizes. Outputs are stored in the cache directory under that key, so:
+
+- a step whose key is already in the cache isn't run again; its outputs are
+  just copied into place, if they aren't there already
+- changing something only rebuilds the steps that depend on it
+- going back to an earlier flag or seed is a cache hit
+
+Independent steps are built in parallel, each in its own process.
+
+Outputs go to a separate tree (dist/ by default, laid out like the repo), and
+steps that need another step's outputs read them from there. The committed
+artifacts in the challenge directories are only overwritten with --install.
+They won't come out byte-for-byte the same as the committed ones: flag.lol was
+made with a random seed that wasn't recorded, entwistion.zip was made with a
+different zip tool (the files in it are the same), and tire.jpg is the solved
+image rather than the original, so tire.jpg.tire is a byte longer.
+
+    python build.py
+    python build.py entwistion.zip --set entwistion.twist.seed=hunter2
+    python build.py --dry-run
+    python build.py --install
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from challenges import REPO_ROOT, import_challenge
+
+DEFAULT_CACHE_DIR = REPO_ROOT / ".build-cache"
+DEFAULT_OUTPUT_DIR = REPO_ROOT / "dist"
+
+# Bump this to invalidate everything in the cache, e.g. if the way keys are
+# computed changes
+CACHE_VERSION = 1
+
+# The timestamp given to every file in a zip, so that the same files always make
+# the same zip
+ZIP_DATE_TIME = (2023, 9, 23, 0, 0, 0)
+
+
+def build_lol(
+    directory: Path, inputs: Dict[str, Path], out_dir: Path, params: Dict[str, Any]
+) -> None:
+    lol = import_challenge(directory, "lol")
+    output_file = out_dir / "flag.lol"
+    _, md5_hash = lol.LOLFile.write_from_file(
+        inputs["flag.png"],
+        output_file,
+        params["min_chunk_size"],
+        params["max_chunk_size"],
+        params["seed"],
+    )
+    lol.LOLFile.verify_lol_path(output_file, md5_hash)
+
+
+def build_twist(
+    directory: Path, inputs: Dict[str, Path], out_dir: Path, params: Dict[str, Any]
+) -> None:
+    entwistion = import_challenge(directory, "entwistion-dev")
+
+    # The state is shared between the two files, like in entwistion-dev.py
+    rng = random.Random(entwistion.SEED if params["seed"] is None else params["seed"])
+    entwistion.entwist_file(inputs["corgi.jpg"], out_dir / "corgi.jpg.twist", rng)
+    entwistion.entwist_file(inputs["flag.png"], out_dir / "flag.png.twist", rng)
+
+
+def build_entwistion_zip(
+    directory: Path, inputs: Dict[str, Path], out_dir: Path, params: Dict[str, Any]
+) -> None:
+    with zipfile.ZipFile(out_dir / "entwistion.zip", "w") as zf:
+        for name in params["members"]:
+            info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+            info.external_attr = 0o644 << 16
+            # The .twist files are as good as random, so there's no point
+            # compressing them
+            info.compress_type = (
+                zipfile.ZIP_STORED if name.endswith(".twist") else zipfile.ZIP_DEFLATED
+            )
+            zf.writestr(info, inputs[name].read_bytes())
+
+
+def build_tire(
+    directory: Path, inputs: Dict[str, Path], out_dir: Path, params: Dict[str, Any]
+) -> None:
+    bitshift = import_challenge(directory, "bitshift")
+    bitshift.shift_file(inputs["tire.jpg"], out_dir / "tire.jpg.tire", params["bits"])
+
+
+class Step(NamedTuple):
+    name: str
+    # The challenge directory, relative to the repo; all the paths below are
+    # relative to it
+    directory: str
+    # The scripts the step runs, whose source goes into its key
+    sources: List[str]
+    inputs: List[str]
+    outputs: List[str]
+    # build(challenge directory, input paths by name, output directory, params)
+    # writes the outputs to the output directory
+    build: Callable[[Path, Dict[str, Path], Path, Dict[str, Any]], None]
+    params: Dict[str, Any]
+
+    @property
+    def path(self) -> Path:
+        return REPO_ROOT / self.directory
+
+    def get_output_dir(self, output_root: Path) -> Path:
+        return output_root / self.directory
+
+
+STEPS = [
+    Step(
+        "lol.flag",
+        "re/lol",
+        sources=["lol.py"],
+        inputs=["flag.png"],
+        outputs=["flag.lol"],
+        build=build_lol,
+        # The chunk sizes from the challenge readme. The committed flag.lol used a
+        # random seed, so any fixed seed gives a different (but equally valid)
+        # layout.
+        params={"min_chunk_size": 100, "max_chunk_size": 200, "seed": "unr-csc23"},
+    ),
+    Step(
+        "entwistion.twist",
+        "crypto/entwistion",
+        sources=["entwistion-dev.py", "mt19937.py"],
+        inputs=["corgi.jpg", "flag.png"],
+        outputs=["corgi.jpg.twist", "flag.png.twist"],
+        build=build_twist,
+        # None uses SEED from entwistion-dev.py
+        params={"seed": None},
+    ),
+    Step(
+        "entwistion.zip",
+        "crypto/entwistion",
+        sources=[],
+        inputs=["corgi.jpg", "corgi.jpg.twist", "entwistion.py", "flag.png.twist"],
+        outputs=["entwistion.zip"],
+        build=build_entwistion_zip,
+        params={"members": ["corgi.jpg", "corgi.jpg.twist", "entwistion.py", "flag.png.twist"]},
+    ),
+    Step(
+        "spare-tire.tire",
+        "digital-forensics/spare-tire",
+        sources=["bitshift.py"],
+        inputs=["tire.jpg"],
+        outputs=["tire.jpg.tire"],
+        build=build_tire,
+        params={"bits": 1},
+    ),
+]
+
+STEPS_BY_NAME = {step.name: step for step in STEPS}
+
+
+def get_dependencies(steps: List[Step]) -> Dict[str, Set[str]]:
+    """
+    Work out which steps depend on which, from which steps' outputs are other
+    steps' inputs.
+    """
+    producers = {}
+    for step in steps:
+        for output in step.outputs:
+            producers[step.path / output] = step.name
+
+    return {
+        step.name: {
+            producers[step.path / path] for path in step.inputs if step.path / path in producers
+        }
+        for step in steps
+    }
+
+
+def get_input_paths(step: Step, output_root: Path) -> Dict[str, Path]:
+    """
+    Work out where each of a step's inputs is: in the output tree if another step
+    makes it, or in the challenge directory if not.
+    """
+    produced = {(other.directory, name) for other in STEPS for name in other.outputs}
+    return {
+        name: (output_root if (step.directory, name) in produced else REPO_ROOT)
+        / step.directory
+        / name
+        for name in step.inputs
+    }
+
+
+class FileHasher:
+    """
+    SHA-256 hashes of files, remembered between runs (by path, size and
+    modification time) so that unchanged files aren't read again.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        try:
+            with open(path) as fp:
+                self.hashes: Dict[str, List] = json.load(fp)
+        except (OSError, ValueError):
+            self.hashes = {}
+
+    def hash(self, path: Path, remember: bool = True) -> Optional[str]:
+        """
+        :param remember: Whether to remember the hash for next time; there's no
+            point for temporary files.
+        :returns: The file's hash, or None if it doesn't exist.
+        """
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+
+        key = str(path.resolve())
+        cached = self.hashes.get(key)
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as fp:
+            while block := fp.read(2**20):
+                sha256.update(block)
+
+        if remember:
+            self.hashes[key] = [stat.st_size, stat.st_mtime_ns, sha256.hexdigest()]
+        return sha256.hexdigest()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as fp:
+            json.dump(self.hashes, fp)
+        os.replace(tmp_path, self.path)
+
+
+class BuildCache:
+    """
+    A directory of build outputs, one subdirectory per key, each with a
+    manifest.json of what's in it.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.hasher = FileHasher(root / "file-hashes.json")
+
+    def get_key(self, step: Step, params: Dict[str, Any], inputs: Dict[str, Path]) -> str:
+        """
+        Hash everything that goes into a step. Its inputs (at the paths in
+        `inputs`) have to exist already, so any steps it depends on have to have
+        been built.
+        """
+        paths = {name: step.path / name for name in step.sources}
+        paths.update(inputs)
+        missing = [name for name, path in paths.items() if self.hasher.hash(path) is None]
+        if missing:
+            raise FileNotFoundError(f"{step.name} needs {', '.join(missing)}, which doesn't exist")
+
+        description = {
+            "version": CACHE_VERSION,
+            "step": step.name,
+            "build": hashlib.sha256(inspect.getsource(step.build).encode()).hexdigest(),
+            "sources": {name: self.hasher.hash(step.path / name) for name in step.sources},
+            "inputs": {name: self.hasher.hash(inputs[name]) for name in step.inputs},
+            "params": params,
+        }
+        encoded = json.dumps(description, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def get_entry(self, key: str) -> Path:
+        return self.root / "objects" / key[:2] / key
+
+    def get_manifest(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self.get_entry(key) / "manifest.json") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    def make_tmp_dir(self) -> Path:
+        (self.root / "tmp").mkdir(parents=True, exist_ok=True)
+        return Path(tempfile.mkdtemp(dir=self.root / "tmp"))
+
+    def store(
+        self, key: str, step: Step, params: Dict[str, Any], tmp_dir: Path, seconds: float
+    ) -> Dict:
+        """
+        Move a finished build's outputs from `tmp_dir` into the cache.
+        """
+        manifest = {
+            "step": step.name,
+            "key": key,
+            "params": params,
+            "seconds": seconds,
+            "outputs": {},
+        }
+        for name in step.outputs:
+            if not (tmp_dir / name).is_file():
+                raise RuntimeError(f"{step.name} didn't write {name}")
+            manifest["outputs"][name] = self.hasher.hash(tmp_dir / name, remember=False)
+
+        with open(tmp_dir / "manifest.json", "w") as fp:
+            json.dump(manifest, fp, indent=2)
+
+        # Rename the whole directory into place in one step, so that an
+        # interrupted build never leaves a partial entry behind
+        entry = self.get_entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(tmp_dir, entry)
+        except OSError:
+            # Someone else stored it first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return manifest
+
+    def install(self, key: str, manifest: Dict, out_dir: Path) -> bool:
+        """
+        Copy a step's outputs from the cache to `out_dir`, unless they're already
+        there.
+
+        :returns: Whether anything was copied.
+        """
+        copied = False
+        for name, digest in manifest["outputs"].items():
+            destination = out_dir / name
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            if self.hasher.hash(destination) == digest:
+                continue
+
+            # Copy rather than link, so that editing the file doesn't change
+            # the cache
+            tmp_path = destination.with_name(destination.name + ".tmp")
+            shutil.copyfile(self.get_entry(key) / name, tmp_path)
+            os.replace(tmp_path, destination)
+            copied = True
+
+        return copied
+
+
+def run_step(name: str, inputs: Dict[str, Path], out_dir: Path, params: Dict[str, Any]) -> float:
+    """
+    Build one step (in a worker process).
+
+    :returns: How long it took, in seconds.
+    """
+    step = STEPS_BY_NAME[name]
+    start = perf_counter()
+    step.build(step.path, inputs, out_dir, params)
+    return perf_counter() - start
+
+
+def build(
+    targets: List[str],
+    params: Dict[str, Dict[str, Any]],
+    cache: BuildCache,
+    output_root: Path = DEFAULT_OUTPUT_DIR,
+    install: bool = False,
+    jobs: Optional[int] = None,
+    force: bool = False,
+    dry_run: bool = False,
+    report: Callable[[str, str], None] = lambda name, status: None,
+) -> bool:
+    """
+    Build the target steps (and whatever they depend on) into `output_root`,
+    running independent steps in parallel. If `install` is set, the outputs are
+    also copied over the committed artifacts in the challenge directories.
+    `report(step name, status)` is called as each one finishes.
+
+    :returns: Whether every step succeeded.
+    """
+
+    def place(step: Step, key: str, manifest: Dict) -> bool:
+        copied = cache.install(key, manifest, step.get_output_dir(output_root))
+        if install:
+            copied = cache.install(key, manifest, step.path) or copied
+        return copied
+
+    dependencies = get_dependencies(STEPS)
+
+    # Everything the targets need, too
+    wanted: Set[str] = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(dependencies[name])
+
+    pending = [step for step in STEPS if step.name in wanted]
+    done: Set[str] = set()
+    # Steps that (would) produce new outputs, or that failed, so anything that
+    # depends on them can't be checked against the cache yet
+    changed: Set[str] = set()
+    failed: Set[str] = set()
+    running: Dict[Future, Tuple[Step, str, Path]] = {}
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(jobs, mp_context=ctx) as executor:
+        while pending or running:
+            for step in [step for step in pending if dependencies[step.name] <= done]:
+                pending.remove(step)
+
+                if dependencies[step.name] & failed:
+                    failed.add(step.name)
+                    done.add(step.name)
+                    report(
+                        step.name, f"skipped ({', '.join(dependencies[step.name] & failed)} failed)"
+                    )
+                    continue
+                if dry_run and dependencies[step.name] & changed:
+                    changed.add(step.name)
+                    done.add(step.name)
+                    report(step.name, "would build (after its dependencies)")
+                    continue
+
+                inputs = get_input_paths(step, output_root)
+                try:
+                    key = cache.get_key(step, params[step.name], inputs)
+                except FileNotFoundError as e:
+                    failed.add(step.name)
+                    done.add(step.name)
+                    report(step.name, f"failed ({e})")
+                    continue
+
+                manifest = None if force else cache.get_manifest(key)
+                if manifest is not None:
+                    if dry_run:
+                        report(step.name, f"cached ({key[:12]})")
+                    elif place(step, key, manifest):
+                        report(step.name, f"restored from cache ({key[:12]})")
+                    else:
+                        report(step.name, f"up to date ({key[:12]})")
+                    done.add(step.name)
+                    continue
+
+                if dry_run:
+                    changed.add(step.name)
+                    done.add(step.name)
+                    report(step.name, f"would build ({key[:12]})")
+                    continue
+
+                tmp_dir = cache.make_tmp_dir()
+                future = executor.submit(run_step, step.name, inputs, tmp_dir, params[step.name])
+                running[future] = (step, key, tmp_dir)
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step, key, tmp_dir = running.pop(future)
+                done.add(step.name)
+                try:
+                    seconds = future.result()
+                    manifest = cache.store(key, step, params[step.name], tmp_dir, seconds)
+                    place(step, key, manifest)
+                except Exception as e:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    failed.add(step.name)
+                    report(step.name, f"failed ({type(e).__name__}: {e})")
+                else:
+                    changed.add(step.name)
+                    report(step.name, f"built in {seconds:.2f}s ({key[:12]})")
+
+    cache.hasher.save()
+    return not failed
+
+
+def parse_value(value: str) -> Any:
+    """
+    Parse a --set value as JSON if it is JSON (numbers, null, lists), or as a
+    string if not.
+    """
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def get_params(overrides: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Apply STEP.PARAM=VALUE overrides to each step's default parameters.
+    """
+    params = {step.name: dict(step.params) for step in STEPS}
+    for override in overrides:
+        target, equals, value = override.partition("=")
+        if not equals:
+            raise ValueError(f"{override} should look like STEP.PARAM=VALUE")
+        name, _, param = target.rpartition(".")
+        if name not in params or param not in params[name]:
+            raise ValueError(f"{target} isn't a parameter of any step")
+        params[name][param] = parse_value(value)
+
+    return params
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Builds the challenge artifacts.")
+
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        help=f"The steps to build, and whatever they depend on (default: all of {', '.join(STEPS_BY_NAME)}).",
+    )
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="STEP.PARAM=VALUE",
+        help="Override a parameter, like lol.flag.seed=abc or lol.flag.min_chunk_size=50. "
+        "Can be given more than once.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="Where to keep built artifacts (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=DEFAULT_OUTPUT_DIR,
+        help="Where to write the outputs, laid out like the repo (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--install",
+        action="store_true",
+        help="Also copy the outputs over the committed artifacts in the challenge "
+        "directories. These won't be byte-for-byte the same as the committed files.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="The number of steps to build at once (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild everything, even if it's in the cache.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        "-n",
+        action="store_true",
+        help="Just say what would be built.",
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="List the steps and their parameters.",
+    )
+
+    args = parser.parse_args()
+    unknown = [target for target in args.targets if target not in STEPS_BY_NAME]
+    if unknown:
+        parser.error(f"unknown step(s): {', '.join(unknown)}")
+
+    try:
+        args.params = get_params(args.set)
+    except ValueError as e:
+        parser.error(str(e))
+
+    return args
+
+
+def main(args: argparse.Namespace) -> None:
+    params = args.params
+
+    if args.list:
+        for step in STEPS:
+            outputs = ", ".join(
+                str(step.get_output_dir(args.output_dir) / name) for name in step.outputs
+            )
+            print(f"{step.name}: {outputs} {json.dumps(params[step.name])}")
+        return
+
+    def report(name: str, status: str) -> None:
+        print(f"{name}: {status}")
+
+    start = perf_counter()
+    ok = build(
+        args.targets or list(STEPS_BY_NAME),
+        params,
+        BuildCache(args.cache_dir),
+        args.output_dir,
+        args.install,
+        args.jobs,
+        args.force,
+        args.dry_run,
+        report,
+    )
+    print(f"Done in {perf_counter() - start:.2f}s")
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(get_args())
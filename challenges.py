@@ -0,0 +1,42 @@
+"""
+Helpers for tools that work across the challenges, like build.py and the
+benchmarks.
+"""
+
+import importlib
+import importlib.util
+import logging
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Union
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+
+def import_challenge(directory: Union[str, Path], module: str) -> ModuleType:
+    """
+    Import a module from a challenge directory (relative to the repo, or
+    absolute), the same way the challenges' scripts import each other.
+
+    Note that some challenges share module names (like solve.py), so only import
+    from one challenge per process if that matters.
+    """
+    path = REPO_ROOT / directory
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+    # Some scripts have names that aren't valid module names
+    if "-" in module:
+        spec = importlib.util.spec_from_file_location(
+            module.replace("-", "_"), path / f"{module}.py"
+        )
+        loaded = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(loaded)
+    else:
+        loaded = importlib.import_module(module)
+
+    # Several of them turn on debug logging for the root logger when imported,
+    # which would otherwise flood the output (and be timed by the benchmarks)
+    logging.getLogger().setLevel(logging.WARNING)
+    return loaded
@@ -0,0 +1,929 @@
+"""
+Crack annual-netid-reset style hashes: MD5(word + word + number + "!"), where
+the words come from `wordlist.txt` and the numbers from `numbers.txt`.
+
+This does the same thing as the hashcat combinator attack in the readme, without
+writing the right-hand side of the wordlist to disk first. The keyspace is split
+into one contiguous range of candidates per worker process. Candidates come out of
+generators in runs that share the same two words, so each worker hashes the first
+word once, the second word once per run, and then just `copy()`s that MD5 context
+for every number.
+
+Any number of hashes can be cracked in the same pass: each candidate is hashed
+once and looked up in a set of the target digests. Hits are written out as soon as
+they're found, and progress can be checkpointed to a file and resumed. Since every
+candidate has an index, --skip and --limit split a crack across machines.
+
+Each worker counts the hashes it's done (and the CPU time it's used) in shared
+memory, which the main process samples to print a progress line with the rate
+and ETA, and to write a final JSON report with --report.
+
+    python crack.py --hash-file netidhash.txt
+    python crack.py --hash-file team-hashes.txt --output cracked.txt --checkpoint crack.json
+    python crack.py --hash-file netidhash.txt --report report.json
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from datetime import timedelta
+from pathlib import Path
+from time import monotonic, perf_counter, process_time
+from typing import (
+    AbstractSet,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+from wordlists import get_digest, load_wordlist
+
+# The number of runs (of one pair of words and all their numbers) between checks
+# of whether every password has already been found
+STOP_CHECK_RUNS = 64
+
+# The number of runs between each worker reporting how far it's got, which is
+# also how much work can be lost (and redone) when resuming from a checkpoint
+PROGRESS_RUNS = 4096
+
+# The default number of seconds between checkpoints
+DEFAULT_CHECKPOINT_INTERVAL = 30
+
+# The default number of seconds between progress lines
+DEFAULT_PROGRESS_INTERVAL = 1.0
+
+
+class Run(NamedTuple):
+    # The index of the first candidate in the run
+    index: int
+    first: int
+    second: int
+    # The range of numbers in the run
+    number_start: int
+    number_end: int
+
+
+class Keyspace:
+    """
+    Every combination of word + word + number + suffix, in order: the first word
+    changes slowest and the number changes fastest.
+
+    Each candidate has an index, which is just its (first word, second word,
+    number) written as a mixed-radix number with digits in base (number of
+    words, number of words, number of numbers). So any index can be turned into
+    a candidate and back without enumerating anything, which is what makes
+    skipping ahead, sharding and resuming exact.
+    """
+
+    def __init__(
+        self, words: Sequence[bytes], numbers: Sequence[bytes], suffix: bytes = b"!"
+    ):
+        self.words = words
+        self.numbers = numbers
+        self.suffix = suffix
+
+        # The end of each candidate, which is all that changes within a run
+        self.tails = [number + suffix for number in numbers]
+
+        # Built when first needed by index_of() and digests()
+        self._word_indexes: Optional[Dict[bytes, int]] = None
+        self._digests: Optional[Tuple[str, str]] = None
+
+    def __len__(self) -> int:
+        return len(self.words) ** 2 * len(self.numbers)
+
+    def to_digits(self, index: int) -> Tuple[int, int, int]:
+        """
+        Split an index into the indexes of its first word, second word and number.
+        """
+        if not 0 <= index < len(self):
+            raise IndexError(f"Index {index} is outside the keyspace (0-{len(self) - 1})")
+
+        pair, number = divmod(index, len(self.numbers))
+        first, second = divmod(pair, len(self.words))
+        return first, second, number
+
+    def from_digits(self, first: int, second: int, number: int) -> int:
+        """
+        The opposite of to_digits().
+        """
+        return (first * len(self.words) + second) * len(self.numbers) + number
+
+    def candidate(self, index: int) -> bytes:
+        """
+        Get the candidate at an index.
+        """
+        first, second, number = self.to_digits(index)
+        return self.words[first] + self.words[second] + self.tails[number]
+
+    def index_of(self, candidate: bytes) -> int:
+        """
+        Get the index of a candidate. If it can be made more than one way (since
+        words can run together), this is the first of them.
+        """
+        if self._word_indexes is None:
+            self._word_indexes = {}
+            for i, word in enumerate(self.words):
+                self._word_indexes.setdefault(bytes(word), i)
+
+        matches = []
+        for number, tail in enumerate(self.tails):
+            if not candidate.endswith(tail):
+                continue
+
+            words = candidate[: len(candidate) - len(tail)]
+            for split in range(1, len(words)):
+                first = self._word_indexes.get(words[:split])
+                second = self._word_indexes.get(words[split:])
+                if first is not None and second is not None:
+                    matches.append(self.from_digits(first, second, number))
+
+        if not matches:
+            raise ValueError(f"{candidate!r} isn't in the keyspace")
+
+        return min(matches)
+
+    def digests(self) -> Tuple[str, str]:
+        """
+        Get the SHA-256 of the words and of the numbers, so that a checkpoint
+        can't be resumed against different wordlists that happen to be the same
+        length.
+        """
+        if self._digests is None:
+            self._digests = get_digest(self.words), get_digest(self.numbers)
+        return self._digests
+
+    def iter_runs(self, start: int, end: int) -> Iterator[Run]:
+        """
+        Lazily generate the candidates from `start` up to (not including) `end`,
+        grouped into runs that share the same two words.
+        """
+        num_numbers = len(self.numbers)
+        index = start
+        while index < end:
+            pair, number = divmod(index, num_numbers)
+            first, second = divmod(pair, len(self.words))
+            number_end = min(num_numbers, number + end - index)
+
+            yield Run(index, first, second, number, number_end)
+            index += number_end - number
+
+    def split(self, parts: int, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Split the keyspace (or the part of it from `start` to `end`) into `parts`
+        contiguous (start, end) ranges of (nearly) the same size.
+        """
+        end = len(self) if end is None else end
+        size = end - start
+        bounds = [start + size * i // parts for i in range(parts + 1)]
+        return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i] < bounds[i + 1]]
+
+
+def crack_range(
+    keyspace: Keyspace,
+    start: int,
+    end: int,
+    targets: AbstractSet[bytes],
+    report: Callable[..., None],
+    stop=None,
+    count: Optional[Callable[[int], None]] = None,
+) -> None:
+    """
+    Hash every candidate in a range of the keyspace, checking each one against
+    every target at once.
+
+    :param targets: The raw 16-byte MD5 digests to look for.
+    :param report: Called as report("hit", index, digest) for every match, and as
+        report("position", index) every so often (and at the end) to say that
+        every candidate before `index` has been checked.
+    :param stop: An optional `multiprocessing.Event`; if it gets set (because
+        everything has been found), give up early.
+    :param count: Optionally called with the number of candidates hashed since it
+        was last called, every STOP_CHECK_RUNS runs and at the end.
+    """
+    words = keyspace.words
+    tails = keyspace.tails
+
+    first = None
+    first_md5 = None
+    counted = start
+    for runs, run in enumerate(keyspace.iter_runs(start, end)):
+        if runs % STOP_CHECK_RUNS == 0:
+            if count is not None and run.index > counted:
+                count(run.index - counted)
+                counted = run.index
+            if stop is not None and stop.is_set():
+                return
+        if runs and runs % PROGRESS_RUNS == 0:
+            report("position", run.index)
+
+        # Only hash each word once per run, or once per first word
+        if run.first != first:
+            first = run.first
+            first_md5 = hashlib.md5(words[first])
+
+        pair_md5 = first_md5.copy()
+        pair_md5.update(words[run.second])
+
+        for number in range(run.number_start, run.number_end):
+            md5 = pair_md5.copy()
+            md5.update(tails[number])
+            digest = md5.digest()
+            if digest in targets:
+                report("hit", run.index + number - run.number_start, digest)
+
+    if count is not None and end > counted:
+        count(end - counted)
+    report("position", end)
+
+
+class CrackSession:
+    """
+    How far a crack has got: the position of each range of the keyspace, and the
+    index of the candidate for each target found so far. This is what gets
+    checkpointed, so a crack can be resumed from (close to) where it stopped.
+    """
+
+    def __init__(
+        self,
+        keyspace: Keyspace,
+        targets: Sequence[bytes],
+        ranges: List[List[int]],
+        found: Optional[Dict[bytes, int]] = None,
+    ):
+        self.keyspace = keyspace
+        self.targets = list(dict.fromkeys(targets))
+        # [start, position, end] for each range, where everything before
+        # position has been checked
+        self.ranges = ranges
+        self.found: Dict[bytes, int] = found or {}
+
+    @classmethod
+    def new(
+        cls,
+        keyspace: Keyspace,
+        targets: Sequence[bytes],
+        jobs: int,
+        skip: int = 0,
+        limit: Optional[int] = None,
+    ) -> "CrackSession":
+        """
+        Start a crack over the candidates from index `skip`, `limit` of them at
+        most (or all the rest).
+        """
+        if not 0 <= skip <= len(keyspace):
+            raise ValueError(f"Can't skip {skip} of {len(keyspace)} candidates")
+
+        end = len(keyspace) if limit is None else min(len(keyspace), skip + limit)
+        ranges = [[start, start, end] for start, end in keyspace.split(jobs, skip, end)]
+        return cls(keyspace, targets, ranges or [[skip, skip, skip]])
+
+    @property
+    def bounds(self) -> Tuple[int, int]:
+        return self.ranges[0][0], self.ranges[-1][2]
+
+    @property
+    def completed(self) -> int:
+        """
+        The number of candidates checked so far.
+        """
+        return sum(position - start for start, position, _ in self.ranges)
+
+    @property
+    def size(self) -> int:
+        start, end = self.bounds
+        return end - start
+
+    def _describe_keyspace(self) -> dict:
+        words_digest, numbers_digest = self.keyspace.digests()
+        return {
+            "size": len(self.keyspace),
+            "words": words_digest,
+            "numbers": numbers_digest,
+            "suffix": self.keyspace.suffix.hex(),
+            "bounds": list(self.bounds),
+        }
+
+    @classmethod
+    def load(cls, path: Path, keyspace: Keyspace, targets: Sequence[bytes]) -> "CrackSession":
+        """
+        Load a checkpoint, making sure that it's for the same crack.
+        """
+        with open(path) as fp:
+            state = json.load(fp)
+
+        session = cls(
+            keyspace,
+            targets,
+            state["ranges"],
+            {bytes.fromhex(digest): index for digest, index in state["found"].items()},
+        )
+        if state["keyspace"] != session._describe_keyspace() or state["targets"] != [
+            target.hex() for target in session.targets
+        ]:
+            raise ValueError(f"{path} is a checkpoint for a different keyspace or hashes")
+
+        return session
+
+    def check_bounds(self, skip: int, limit: Optional[int]) -> None:
+        """
+        Make sure that a resumed session covers the same part of the keyspace as
+        --skip and --limit ask for.
+        """
+        end = len(self.keyspace) if limit is None else min(len(self.keyspace), skip + limit)
+        if (skip, end) != self.bounds:
+            raise ValueError(
+                f"The checkpoint covers candidates {self.bounds[0]}-{self.bounds[1]}, "
+                f"not {skip}-{end}"
+            )
+
+    def save(self, path: Path) -> None:
+        """
+        Write a checkpoint, replacing the old one in one step so that a crash
+        partway through doesn't lose it.
+        """
+        state = {
+            "keyspace": self._describe_keyspace(),
+            "targets": [target.hex() for target in self.targets],
+            "ranges": self.ranges,
+            "completed": self.completed,
+            "found": {digest.hex(): index for digest, index in self.found.items()},
+        }
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as fp:
+            json.dump(state, fp)
+        os.replace(tmp_path, path)
+
+    def remaining_targets(self) -> FrozenSet[bytes]:
+        return frozenset(self.targets) - self.found.keys()
+
+    def remaining_ranges(self) -> List[Tuple[int, int, int]]:
+        """
+        Get (range id, position, end) for each range that isn't finished.
+        """
+        return [
+            (i, position, end)
+            for i, (_, position, end) in enumerate(self.ranges)
+            if position < end
+        ]
+
+    def is_done(self) -> bool:
+        return not self.remaining_targets() or not self.remaining_ranges()
+
+    def handle(self, kind: str, range_id: int, *args) -> Optional[Tuple[bytes, bytes]]:
+        """
+        Record a report from crack_range().
+
+        :returns: (digest, password) if this was a new hit.
+        """
+        if kind == "position":
+            (self.ranges[range_id][1],) = args
+        elif kind == "hit":
+            index, digest = args
+            if digest not in self.found:
+                self.found[digest] = index
+                return digest, self.keyspace.candidate(index)
+
+        return None
+
+
+class WorkerCounters(NamedTuple):
+    """
+    One slot per worker process in shared memory, which only that worker writes
+    to. Plain (lock-free) arrays are fine, since each slot has a single writer
+    and the reader only needs a recent value, not an exact one.
+    """
+
+    hashes: "multiprocessing.sharedctypes.Array"
+    cpu_seconds: "multiprocessing.sharedctypes.Array"
+    pids: "multiprocessing.sharedctypes.Array"
+    # The next free slot
+    next_slot: "multiprocessing.sharedctypes.Synchronized"
+
+    @classmethod
+    def create(cls, workers: int, ctx=multiprocessing) -> "WorkerCounters":
+        return cls(
+            ctx.RawArray("Q", workers),
+            ctx.RawArray("d", workers),
+            ctx.RawArray("i", workers),
+            ctx.Value("i", 0),
+        )
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def register(self) -> Callable[[int], None]:
+        """
+        Claim a slot for the calling process.
+
+        :returns: The function to count its hashes with (see crack_range()),
+            which also records how much CPU time the process has used since now.
+        """
+        with self.next_slot.get_lock():
+            slot = self.next_slot.value
+            self.next_slot.value += 1
+
+        self.pids[slot] = os.getpid()
+        cpu_start = process_time()
+
+        def count(hashes: int) -> None:
+            self.hashes[slot] += hashes
+            self.cpu_seconds[slot] = process_time() - cpu_start
+
+        return count
+
+
+def format_rate(hashes_per_second: float) -> str:
+    return f"{hashes_per_second / 1e6:.2f} MH/s"
+
+
+class CrackMonitor:
+    """
+    Samples the workers' counters to print a progress line every `interval`
+    seconds, and to make the final report.
+    """
+
+    def __init__(
+        self,
+        session: CrackSession,
+        interval: float = DEFAULT_PROGRESS_INTERVAL,
+        stream: Optional[TextIO] = sys.stderr,
+    ):
+        self.session = session
+        self.interval = interval
+        # Where to print progress, or None not to
+        self.stream = stream if interval > 0 else None
+        # Overwrite the same line on a terminal, rather than printing a new one
+        self.overwrite = stream is not None and stream.isatty()
+
+        self.counters: Optional[WorkerCounters] = None
+        self.completed_before = session.completed
+        self.todo = 0
+        self.started = self.finished = self.last_print = None
+        self.line_length = 0
+
+    def start(self, counters: WorkerCounters) -> None:
+        self.counters = counters
+        self.completed_before = self.session.completed
+        self.todo = self.session.size - self.completed_before
+        self.started = self.last_print = monotonic()
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or monotonic()) - self.started
+
+    def hashes(self) -> List[int]:
+        """
+        The number of hashes each worker has done so far.
+        """
+        return list(self.counters.hashes) if self.counters is not None else []
+
+    def format_progress(self) -> str:
+        hashes = self.hashes()
+        done = sum(hashes)
+        elapsed = self.elapsed()
+        rate = done / elapsed if elapsed else 0.0
+
+        checked = self.completed_before + done
+        coverage = checked / self.session.size if self.session.size else 1.0
+        eta = timedelta(seconds=round((self.todo - done) / rate)) if rate else "?"
+
+        line = (
+            f"{coverage:6.1%} {checked:,}/{self.session.size:,}, {format_rate(rate)}, "
+            f"ETA {eta}, found {len(self.session.found)}/{len(self.session.targets)}"
+        )
+        if len(hashes) > 1 and elapsed:
+            line += f" (slowest worker {format_rate(min(hashes) / elapsed)})"
+        return line
+
+    def print_progress(self) -> None:
+        if self.stream is None or self.counters is None:
+            return
+
+        line = self.format_progress()
+        if self.overwrite:
+            self.stream.write("\r" + line.ljust(self.line_length))
+            self.line_length = len(line)
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+        self.last_print = monotonic()
+
+    def update(self) -> None:
+        """
+        Print the progress line, if it's been long enough since the last one.
+        """
+        if self.last_print is not None and monotonic() - self.last_print >= self.interval:
+            self.print_progress()
+
+    def clear(self) -> None:
+        """
+        Get the progress line out of the way before printing something else.
+        """
+        if self.overwrite and self.line_length:
+            self.stream.write("\r" + " " * self.line_length + "\r")
+            self.stream.flush()
+            self.line_length = 0
+
+    def finish(self) -> None:
+        """
+        Stop the clock, and leave the last progress line on screen.
+        """
+        self.finished = monotonic()
+        self.print_progress()
+        if self.overwrite and self.line_length:
+            self.stream.write("\n")
+            self.line_length = 0
+
+    def report(self) -> dict:
+        """
+        Totals, per-worker rates and CPU use, for sizing hardware and spotting
+        stragglers.
+        """
+        elapsed = self.elapsed()
+        counters = self.counters
+        workers = []
+        if counters is not None:
+            for slot in range(min(len(counters), counters.next_slot.value)):
+                hashes = counters.hashes[slot]
+                cpu_seconds = counters.cpu_seconds[slot]
+                workers.append(
+                    {
+                        "worker": slot,
+                        "pid": counters.pids[slot],
+                        "hashes": hashes,
+                        "hashes_per_second": hashes / elapsed if elapsed else None,
+                        "hashes_per_cpu_second": hashes / cpu_seconds if cpu_seconds else None,
+                        "cpu_seconds": cpu_seconds,
+                        "cpu_utilization": cpu_seconds / elapsed if elapsed else None,
+                    }
+                )
+
+        hashes = sum(worker["hashes"] for worker in workers)
+        cpu_seconds = sum(worker["cpu_seconds"] for worker in workers)
+        start, end = self.session.bounds
+        return {
+            "elapsed_seconds": elapsed,
+            "hashes": hashes,
+            "hashes_per_second": hashes / elapsed if elapsed else None,
+            "keyspace": {
+                "size": len(self.session.keyspace),
+                "bounds": [start, end],
+                "completed": self.session.completed,
+                "coverage": self.session.completed / self.session.size
+                if self.session.size
+                else 1.0,
+            },
+            "targets": len(self.session.targets),
+            "found": len(self.session.found),
+            "cpu_count": os.cpu_count(),
+            "cpu_seconds": cpu_seconds,
+            # Of the CPUs the workers could have used between them
+            "cpu_utilization": cpu_seconds / (elapsed * len(workers))
+            if elapsed and workers
+            else None,
+            "workers": workers,
+        }
+
+
+# Set in each worker process by _init_worker
+_keyspace: Optional[Keyspace] = None
+_targets: FrozenSet[bytes] = frozenset()
+_stop = None
+_messages = None
+_count: Optional[Callable[[int], None]] = None
+
+
+def _init_worker(
+    keyspace: Keyspace,
+    targets: FrozenSet[bytes],
+    stop,
+    messages,
+    counters: Optional[WorkerCounters],
+) -> None:
+    global _keyspace, _targets, _stop, _messages, _count
+    _keyspace, _targets, _stop, _messages = keyspace, targets, stop, messages
+    _count = counters.register() if counters is not None else None
+
+
+def _crack_range(job: Tuple[int, int, int]) -> None:
+    range_id, start, end = job
+
+    def report(kind: str, *args) -> None:
+        _messages.put((kind, range_id, *args))
+
+    # Always say when we're done, even if something goes wrong, so that the main
+    # process isn't left waiting
+    try:
+        crack_range(_keyspace, start, end, _targets, report, _stop, _count)
+    finally:
+        _messages.put(("done", range_id))
+
+
+def crack(
+    session: CrackSession,
+    jobs: int,
+    on_hit: Callable[[bytes, bytes], None],
+    checkpoint: Optional[Path] = None,
+    checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL,
+    monitor: Optional[CrackMonitor] = None,
+) -> None:
+    """
+    Search what's left of the keyspace for the targets that haven't been found
+    yet, one process per range, until every range is finished or every target is
+    found. `on_hit(digest, password)` is called as soon as each one turns up, and
+    the session is checkpointed every `checkpoint_interval` seconds. If there's a
+    `monitor`, the workers count their hashes for it.
+    """
+    remaining = session.remaining_ranges()
+    targets = session.remaining_targets()
+    if not remaining or not targets:
+        return
+
+    workers = 1 if jobs == 1 else min(jobs, len(remaining))
+    ctx = multiprocessing.get_context("spawn")
+    counters = None
+    if monitor is not None:
+        counters = WorkerCounters.create(workers, ctx)
+        monitor.start(counters)
+
+    last_save = monotonic()
+
+    def handle(kind: str, range_id: int, *args) -> None:
+        nonlocal last_save
+
+        hit = session.handle(kind, range_id, *args)
+        if hit is not None:
+            on_hit(*hit)
+            if not session.remaining_targets():
+                stop.set()
+
+        if checkpoint is not None and (hit or monotonic() - last_save >= checkpoint_interval):
+            session.save(checkpoint)
+            last_save = monotonic()
+
+    if jobs == 1:
+        stop = threading.Event()
+        count = None
+        if counters is not None:
+            count_hashes = counters.register()
+
+            def count(hashes: int) -> None:
+                count_hashes(hashes)
+                monitor.update()
+
+        for range_id, start, end in remaining:
+            crack_range(
+                session.keyspace,
+                start,
+                end,
+                targets,
+                lambda kind, *args: handle(kind, range_id, *args),
+                stop,
+                count,
+            )
+        return
+
+    stop = ctx.Event()
+    messages = ctx.Queue()
+    with ctx.Pool(
+        workers,
+        initializer=_init_worker,
+        initargs=(session.keyspace, targets, stop, messages, counters),
+    ) as pool:
+        result = pool.map_async(_crack_range, remaining)
+
+        # Wake up at least once per progress line, even if nothing's reported
+        timeout = None
+        if monitor is not None and monitor.interval > 0:
+            timeout = monitor.interval
+
+        running = len(remaining)
+        while running:
+            try:
+                kind, range_id, *args = messages.get(timeout=timeout)
+            except queue.Empty:
+                kind = None
+
+            if kind == "done":
+                running -= 1
+            elif kind is not None:
+                handle(kind, range_id, *args)
+
+            if monitor is not None:
+                monitor.update()
+
+        # Raise anything that went wrong in a worker
+        result.get()
+
+
+def load_targets(hashes: Sequence[str], hash_files: Sequence[Path]) -> List[bytes]:
+    """
+    Parse MD5 hashes given in hex, directly or one per line in files.
+    """
+    hex_hashes = list(hashes)
+    for path in hash_files:
+        hex_hashes.extend(line.strip() for line in path.read_text().splitlines() if line.strip())
+
+    targets = []
+    for hex_hash in hex_hashes:
+        target = bytes.fromhex(hex_hash)
+        if len(target) != 16:
+            raise ValueError(f"{hex_hash} isn't an MD5 hash")
+        targets.append(target)
+
+    return targets
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Cracks MD5(word + word + number + '!') hashes."
+    )
+
+    parser.add_argument(
+        "--wordlist",
+        type=Path,
+        default=Path(__file__).with_name("wordlist.txt"),
+        help="The words to combine, as text or an index from wordlists.py "
+        "(default: %(default)s).",
+    )
+    parser.add_argument(
+        "--numbers",
+        type=Path,
+        default=Path(__file__).with_name("numbers.txt"),
+        help="The numbers to put after the words, as text or an index from "
+        "wordlists.py (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--suffix",
+        default="!",
+        help="What goes at the very end (default: %(default)s).",
+    )
+
+    parser.add_argument(
+        "--hash",
+        action="append",
+        default=[],
+        help="An MD5 hash to crack, in hex. Can be given more than once.",
+    )
+    parser.add_argument(
+        "--hash-file",
+        type=Path,
+        action="append",
+        default=[],
+        help="A file of MD5 hashes to crack, one per line. Can be given more than once.",
+    )
+
+    parser.add_argument(
+        "--skip",
+        type=int,
+        default=0,
+        help="Start from this candidate index, e.g. to shard a crack across machines.",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        help="Check at most this many candidates (default: all the rest).",
+    )
+
+    parser.add_argument(
+        "--candidate-at",
+        type=int,
+        metavar="INDEX",
+        help="Just print the candidate at an index and exit.",
+    )
+    parser.add_argument(
+        "--index-of",
+        metavar="CANDIDATE",
+        help="Just print the index of a candidate and exit.",
+    )
+
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Append each hash:password to this file as soon as it's found.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        help="Save progress to this file, and resume from it if it already exists.",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=DEFAULT_CHECKPOINT_INTERVAL,
+        help="Seconds between checkpoints (default: %(default)s).",
+    )
+
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=DEFAULT_PROGRESS_INTERVAL,
+        help="Seconds between progress lines on stderr; 0 for none (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="Write a JSON report of the rates and CPU use of each worker to this file.",
+    )
+
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help="The number of worker processes (default: %(default)s).",
+    )
+
+    args = parser.parse_args()
+    lookup = args.candidate_at is not None or args.index_of is not None
+    if not args.hash and not args.hash_file and not lookup:
+        parser.error("at least one of --hash or --hash-file is required")
+
+    return args
+
+
+def main(args: argparse.Namespace) -> None:
+    keyspace = Keyspace(
+        load_wordlist(args.wordlist), load_wordlist(args.numbers), args.suffix.encode()
+    )
+
+    try:
+        if args.candidate_at is not None:
+            print(keyspace.candidate(args.candidate_at).decode(errors="replace"))
+            return
+        if args.index_of is not None:
+            print(keyspace.index_of(args.index_of.encode()))
+            return
+
+        targets = load_targets(args.hash, args.hash_file)
+        if args.checkpoint is not None and args.checkpoint.exists():
+            session = CrackSession.load(args.checkpoint, keyspace, targets)
+            session.check_bounds(args.skip, args.limit)
+            print(
+                f"Resuming from {args.checkpoint} ({session.completed:,} candidates done, "
+                f"{len(session.found)} found)"
+            )
+        else:
+            session = CrackSession.new(keyspace, targets, args.jobs, args.skip, args.limit)
+    except (IndexError, ValueError) as e:
+        sys.exit(f"{Path(sys.argv[0]).name}: error: {e}")
+
+    start, end = session.bounds
+    print(
+        f"Trying candidates {start:,}-{end:,} of {len(keyspace):,} against "
+        f"{len(session.targets)} hash(es) with {args.jobs} process(es)..."
+    )
+
+    output = open(args.output, "a") if args.output else None
+    monitor = CrackMonitor(session, args.progress_interval)
+
+    def on_hit(digest: bytes, password: bytes) -> None:
+        line = f"{digest.hex()}:{password.decode(errors='replace')}"
+        monitor.clear()
+        print(f"Found {line}")
+        if output is not None:
+            output.write(line + "\n")
+            output.flush()
+
+    start = perf_counter()
+    try:
+        crack(session, args.jobs, on_hit, args.checkpoint, args.checkpoint_interval, monitor)
+    except KeyboardInterrupt:
+        monitor.clear()
+        print("Interrupted" + (f", progress saved to {args.checkpoint}" if args.checkpoint else ""))
+        sys.exit(130)
+    finally:
+        # Ctrl-C included - save wherever we got to
+        if args.checkpoint is not None:
+            session.save(args.checkpoint)
+        if output is not None:
+            output.close()
+
+        monitor.finish()
+        if args.report is not None:
+            with open(args.report, "w") as fp:
+                json.dump(monitor.report(), fp, indent=2)
+    elapsed = perf_counter() - start
+
+    print(f"Found {len(session.found)} of {len(session.targets)} (in {elapsed:.1f}s)")
+    if session.remaining_targets():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(get_args())
@@ -0,0 +1,326 @@
+"""
+Turn raw wordlists (like CeWL's output) into the words and numbers the
+annual-netid-reset passwords are made from, and store them in a binary index that
+can be memory-mapped instead of parsed.
+
+The challenge rules are: everything is lowercase, words are 4+ letters, and
+numbers are separate from words. So each line is lowercased and split into runs
+of letters and runs of digits (e.g. "faculty180" becomes "faculty" and "180"),
+and CeWL's banner line is dropped.
+
+Deduplication is an external sort, so the input can be much bigger than memory:
+tokens are collected into sorted runs of at most `chunk_size` unique tokens on
+disk, then merged.
+
+An index file is:
+
+- a header: the magic b"WLIX", the width of each offset (4 or 8 bytes), 3 bytes of
+  padding, and the number of entries as a little-endian uint64
+- count + 1 little-endian offsets into the blob
+- the blob: every entry, back to back
+
+    python wordlists.py wordlist.txt --words words.idx --numbers numbers.idx
+"""
+
+import argparse
+import hashlib
+import heapq
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+from array import array
+from contextlib import ExitStack
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+MIN_WORD_LENGTH = 4
+
+# The number of unique tokens to hold in memory at once before writing a sorted
+# run to disk
+DEFAULT_CHUNK_SIZE = 2**20
+
+INDEX_MAGIC = b"WLIX"
+INDEX_HEADER = struct.Struct("<4sB3xQ")
+
+# Runs of letters (in any language) or runs of digits
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+")
+
+# CeWL prints this at the top of its output
+BANNER_PREFIX = b"CeWL "
+
+
+def tokenize(
+    lines: Iterable[bytes], min_word_length: int = MIN_WORD_LENGTH
+) -> Iterator[Tuple[bool, bytes]]:
+    """
+    Apply the challenge rules to each line.
+
+    :returns: (is_number, token) for each word or number, UTF-8 encoded.
+    """
+    for line in lines:
+        if line.startswith(BANNER_PREFIX):
+            continue
+
+        for token in TOKEN_PATTERN.findall(line.decode("utf-8", errors="replace").lower()):
+            if token.isdigit():
+                yield True, token.encode()
+            elif len(token) >= min_word_length:
+                yield False, token.encode()
+
+
+class ExternalSorter:
+    """
+    Sort and deduplicate a stream of tokens, holding at most `chunk_size` of them
+    in memory at once.
+    """
+
+    def __init__(self, tmp_dir: Path, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.tmp_dir = tmp_dir
+        self.chunk_size = chunk_size
+        self.chunk = set()
+        self.runs: List[Path] = []
+
+    def add(self, token: bytes) -> None:
+        self.chunk.add(token)
+        if len(self.chunk) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self.chunk:
+            return
+
+        fd, name = tempfile.mkstemp(dir=self.tmp_dir, suffix=".run")
+        with os.fdopen(fd, "wb") as fp:
+            fp.writelines(token + b"\n" for token in sorted(self.chunk))
+
+        self.runs.append(Path(name))
+        self.chunk = set()
+
+    def __iter__(self) -> Iterator[bytes]:
+        """
+        Merge the sorted runs, skipping duplicates between them.
+        """
+        self._flush()
+
+        with ExitStack() as stack:
+            files = [stack.enter_context(open(path, "rb")) for path in self.runs]
+            previous = None
+            for line in heapq.merge(*files):
+                token = line[:-1]
+                if token != previous:
+                    yield token
+                    previous = token
+
+
+def write_index(tokens: Iterable[bytes], path: Path) -> int:
+    """
+    Write tokens to an index file, streaming both the offsets and the blob
+    through temporary files so that memory use doesn't depend on the number of
+    tokens.
+
+    :returns: The number of tokens written.
+    """
+    with tempfile.TemporaryFile() as offsets_fp, tempfile.TemporaryFile() as blob_fp:
+        offsets = array("Q", [0])
+        count = 0
+        size = 0
+        for token in tokens:
+            blob_fp.write(token)
+            size += len(token)
+            count += 1
+            offsets.append(size)
+
+            if len(offsets) >= DEFAULT_CHUNK_SIZE:
+                offsets.tofile(offsets_fp)
+                offsets = array("Q")
+        offsets.tofile(offsets_fp)
+
+        width = 4 if size < 2**32 else 8
+        with open(path, "wb") as fp:
+            fp.write(INDEX_HEADER.pack(INDEX_MAGIC, width, count))
+
+            offsets_fp.seek(0)
+            while block := offsets_fp.read(8 * DEFAULT_CHUNK_SIZE):
+                block_offsets = np.frombuffer(block, dtype=np.uint64)
+                fp.write(block_offsets.astype(f"<u{width}").tobytes())
+
+            blob_fp.seek(0)
+            shutil.copyfileobj(blob_fp, fp)
+
+    return count
+
+
+class WordIndex:
+    """
+    A read-only, memory-mapped list of the entries in an index file.
+
+    Opening one only reads the header; entries are sliced straight out of the
+    mapping when they're asked for. It can also be sent to other processes (it
+    just reopens the file).
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+        with open(self.path, "rb") as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, width, self.count = INDEX_HEADER.unpack_from(self._mm)
+        if magic != INDEX_MAGIC or width not in (4, 8):
+            raise ValueError(f"{self.path} isn't a wordlist index")
+
+        self.offsets = np.frombuffer(
+            self._mm, dtype=f"<u{width}", count=self.count + 1, offset=INDEX_HEADER.size
+        )
+        self._blob_start = INDEX_HEADER.size + width * (self.count + 1)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[bytes, List[bytes]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("Wordlist index out of range")
+
+        start = self._blob_start + int(self.offsets[index])
+        end = self._blob_start + int(self.offsets[index + 1])
+        return self._mm[start:end]
+
+    def __iter__(self) -> Iterator[bytes]:
+        for i in range(self.count):
+            yield self[i]
+
+    def update_digest(self, sha256) -> None:
+        """
+        Hash the entries straight out of the mapping; see `get_digest`.
+        """
+        sha256.update(self.count.to_bytes(8, "little"))
+        for start in range(0, len(self.offsets), DEFAULT_CHUNK_SIZE):
+            offsets = self.offsets[start : start + DEFAULT_CHUNK_SIZE]
+            sha256.update(offsets.astype("<u8").tobytes())
+
+        with memoryview(self._mm) as view, view[self._blob_start :] as blob:
+            sha256.update(blob)
+
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path: Path) -> None:
+        self.__init__(path)
+
+    def close(self) -> None:
+        # Drop the array over the mapping first, or mmap refuses to close
+        del self.offsets
+        self._mm.close()
+
+
+def load_wordlist(path: Path) -> Union[WordIndex, List[bytes]]:
+    """
+    Load an index file if `path` is one, or otherwise the non-empty lines of a
+    plain text wordlist.
+    """
+    with open(path, "rb") as fp:
+        if fp.read(len(INDEX_MAGIC)) == INDEX_MAGIC:
+            return WordIndex(path)
+
+        fp.seek(0)
+        return [line for line in fp.read().splitlines() if line]
+
+
+def get_digest(entries: Union[WordIndex, Sequence[bytes]]) -> str:
+    """
+    Get a SHA-256 of the entries of a wordlist, in order. An index and a plain
+    text wordlist with the same entries have the same digest.
+    """
+    sha256 = hashlib.sha256()
+    if isinstance(entries, WordIndex):
+        entries.update_digest(sha256)
+    else:
+        offsets = np.zeros(len(entries) + 1, dtype="<u8")
+        np.cumsum([len(entry) for entry in entries], out=offsets[1:])
+        sha256.update(len(entries).to_bytes(8, "little"))
+        sha256.update(offsets.tobytes())
+        sha256.update(b"".join(entries))
+
+    return sha256.hexdigest()
+
+
+def build_indexes(
+    inputs: Iterable[BinaryIO],
+    words_path: Path,
+    numbers_path: Path,
+    min_word_length: int = MIN_WORD_LENGTH,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Tuple[int, int]:
+    """
+    Normalize and deduplicate wordlists into a words index and a numbers index.
+
+    :returns: The number of words and numbers written.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        words = ExternalSorter(Path(tmp), chunk_size)
+        numbers = ExternalSorter(Path(tmp), chunk_size)
+
+        for fp in inputs:
+            for is_number, token in tokenize(fp, min_word_length):
+                (numbers if is_number else words).add(token)
+
+        return write_index(words, words_path), write_index(numbers, numbers_path)
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Normalizes wordlists into words and numbers indexes."
+    )
+
+    parser.add_argument("input_files", type=Path, nargs="+", help="Raw wordlists.")
+    parser.add_argument(
+        "--words",
+        type=Path,
+        default=Path("words.idx"),
+        help="Where to write the words (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--numbers",
+        type=Path,
+        default=Path("numbers.idx"),
+        help="Where to write the numbers (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--min-length",
+        type=int,
+        default=MIN_WORD_LENGTH,
+        help="The minimum length of a word (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="The most unique tokens to hold in memory at once (default: %(default)s).",
+    )
+
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    with ExitStack() as stack:
+        inputs = [stack.enter_context(open(path, "rb")) for path in args.input_files]
+        num_words, num_numbers = build_indexes(
+            inputs, args.words, args.numbers, args.min_length, args.chunk_size
+        )
+
+    print(f"Wrote {num_words:,} words to {args.words}")
+    print(f"Wrote {num_numbers:,} numbers to {args.numbers}")
+
+
+if __name__ == "__main__":
+    main(get_args())
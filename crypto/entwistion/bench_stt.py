@@ -0,0 +1,110 @@
+"""
+Compare how long it takes `stt.Untwister` to build its constraints, and how much
+memory they take, with and without the cached twist/output templates.
+
+Only the build step is measured (solving is the same problem either way, and
+takes far longer). Each configuration runs in a fresh process, so that peak
+memory use and Z3's own caches from one run don't leak into the next.
+
+    python bench_stt.py
+    python bench_stt.py --submissions 624 1337 --json results.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import resource
+import sys
+from time import perf_counter
+from typing import Dict, List
+
+DEFAULT_SUBMISSIONS = [624, 1337, 5000]
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux, but bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def run_one(submissions: int, use_templates: bool, seed: int = 0) -> Dict:
+    """
+    Build the constraints for `submissions` 16-bit outputs (the same kind of
+    input as `stt.test()`) and report how long it took.
+    """
+    import stt
+
+    r = random.Random(seed)
+    guesses = [bin(r.getrandbits(16))[2:] + "?" * 16 for _ in range(submissions)]
+
+    # The templates are built once per process, so time that separately from
+    # instantiating them
+    start = perf_counter()
+    if use_templates:
+        stt.get_templates()
+    template_seconds = perf_counter() - start
+
+    rss_before = _max_rss_mb()
+    ut = stt.Untwister(use_templates=use_templates)
+    for guess in guesses:
+        ut.submit(guess)
+
+    start = perf_counter()
+    ut.build_constraints()
+    build_seconds = perf_counter() - start
+
+    return {
+        "submissions": submissions,
+        "templates": use_templates,
+        "template_seconds": template_seconds,
+        "build_seconds": build_seconds,
+        "peak_rss_growth_mb": _max_rss_mb() - rss_before,
+        "assertions": len(ut.solver.assertions()),
+        "variables": ut.num_variables,
+    }
+
+
+def _run_one(args) -> Dict:
+    return run_one(*args)
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--submissions",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SUBMISSIONS,
+        help="Numbers of outputs to submit (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    configs = [(n, use_templates, args.seed) for n in args.submissions for use_templates in (False, True)]
+
+    # One task per process, so every run starts from a clean slate
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        results = []
+        for config in configs:
+            results.append(pool.apply(_run_one, (config,)))
+            result = results[-1]
+            print(
+                f"{result['submissions']:>6} submissions, "
+                f"{'templates' if result['templates'] else 'expressions':<11}: "
+                f"build {result['build_seconds']:7.3f}s "
+                f"(+{result['template_seconds']:.3f}s templates), "
+                f"peak RSS +{result['peak_rss_growth_mb']:7.1f} MB, "
+                f"{result['assertions']:>6} assertions, "
+                f"{result['variables']:>6} variables"
+            )
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
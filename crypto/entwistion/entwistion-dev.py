@@ -6,9 +6,12 @@ Distribute this file with comments and the seed removed.
 
 import random
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 
+from mt19937 import MT19937, xor_file
+
 INPUT_FILE_1 = Path("corgi.jpg")
 INPUT_FILE_2 = Path("flag.png")
 
@@ -18,12 +21,14 @@ OUTPUT_PATH_2 = Path("flag.png.twist")
 SEED = "{$(R4'c&Mn}V[~QL=zXm(qeW@'D-SXv."
 
 
-def entwist(input_file: Path) -> bytes:
+def entwist(input_file: Path, rng: Optional[random.Random] = None) -> bytes:
     """
     Encrypt a file.
 
-    Assumes that `random` has already been initialized appropriately.
+    Uses `rng` for the key if given, and advances it; otherwise, assumes that the
+    module-global `random` has already been initialized appropriately.
     """
+    rng = random if rng is None else rng
 
     with open(input_file, "rb") as fp:
         # Each "output" of the Mersenne Twister is 32 bits. But to avoid having
@@ -42,8 +47,14 @@ def entwist(input_file: Path) -> bytes:
     if len(pt) < 2496:
         print("Plaintext is shorter than 2,496 bytes")
 
-    # Pull a number of 8-bit outputs equal in length to the file itself
-    key = np.frombuffer(random.randbytes(len(pt)), dtype=np.uint8)
+    # Pull a number of 8-bit outputs equal in length to the file itself. This is
+    # exactly `rng.randbytes(len(pt))`, but generated with NumPy straight into
+    # the key array; afterwards, hand the advanced state back to `rng` so it's
+    # still shared between calls.
+    mt = MT19937(rng.getstate())
+    key = np.empty(len(pt), dtype=np.uint8)
+    mt.fill_bytes(key)
+    rng.setstate(mt.getstate())
 
     # XOR the two together, effectively "encrypting" it - but since we can predict
     # the output of the Mersenne Twister given enough information, this isn't
@@ -65,13 +76,35 @@ def entwist(input_file: Path) -> bytes:
     return ct.tobytes()
 
 
+def entwist_file(
+    input_file: Path, output_file: Path, rng: Optional[random.Random] = None
+) -> None:
+    """
+    Encrypt a file, streaming it from `input_file` to `output_file`.
+
+    This gives exactly the same result as writing out `entwist(input_file, rng)`,
+    but both files are memory-mapped and XOR'd a few MB at a time, so it works on
+    files of any size. Like `entwist()`, this uses and advances `rng` if given,
+    or the module-global `random` if not.
+    """
+    rng = random if rng is None else rng
+
+    # REMOVE THIS when distributing the source code.
+    if input_file.stat().st_size < 2496:
+        print("Plaintext is shorter than 2,496 bytes")
+
+    # The key is generated one block at a time into a reusable buffer, but it's
+    # still one continuous keystream, the same as `rng.randbytes(file size)`.
+    mt = MT19937(rng.getstate())
+    xor_file(input_file, output_file, mt)
+    rng.setstate(mt.getstate())
+
+
 if __name__ == "__main__":
-    # If seed is None, the current time is used.
-    r = random.seed(SEED)
+    # If seed is None, the current time is used. This gives the same stream as
+    # `random.seed(SEED)`, without touching the module-global state.
+    rng = random.Random(SEED)
 
     # The state *should* be shared between these two.
-    with open(OUTPUT_PATH_1, "wb") as fp:
-        fp.write(entwist(INPUT_FILE_1))
-
-    with open(OUTPUT_PATH_2, "wb") as fp:
-        fp.write(entwist(INPUT_FILE_2))
+    entwist_file(INPUT_FILE_1, OUTPUT_PATH_1, rng)
+    entwist_file(INPUT_FILE_2, OUTPUT_PATH_2, rng)
@@ -0,0 +1,327 @@
+"""
+Recover the state of Python's Mersenne Twister by solving a linear system over
+GF(2), as a much faster alternative to the Z3-based `stt.Untwister`.
+
+Both tempering and twisting only ever shift, mask and XOR bits together, so every
+bit of every output is just the XOR of some subset of the bits of the initial
+state. Each known output bit is then one linear equation, and 19,968 independent
+equations pin down the whole state. Each equation is a row of bits, packed 64 to a
+word, and the system is solved with Gaussian elimination in NumPy.
+
+`LinearUntwister` has the same interface as `stt.Untwister`:
+
+    ut = LinearUntwister()
+    for _ in range(1337):
+        ut.submit(bin(r1.getrandbits(16))[2:] + "?" * 16)
+    r2 = ut.get_random()
+"""
+
+import logging
+from random import Random
+from time import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from mt19937 import MATRIX_A, WORD_BITS, M, N, parse_guess, parse_words, temper, twist
+
+logger = logging.getLogger(__name__)
+
+# The number of unknowns, one per bit of the initial state
+NUM_VARS = N * WORD_BITS
+
+# The number of uint64s it takes to hold one row of coefficients, plus one more
+# for the right-hand side of the equation (which is always bit 0 of that word)
+NUM_VAR_WORDS = (NUM_VARS + 63) // 64
+ROW_WORDS = NUM_VAR_WORDS + 1
+
+
+def _get_temper_matrix() -> np.ndarray:
+    """
+    Get tempering as a 32x32 matrix over GF(2), such that bit i of the tempered
+    word is the XOR of the bits j of the untempered word where T[i, j] is set.
+    """
+    basis = np.array([1 << j for j in range(WORD_BITS)], dtype=np.uint32)
+    temper(basis)
+
+    # Column j is the tempered value of bit j on its own
+    return (
+        (basis[None, :] >> np.arange(WORD_BITS, dtype=np.uint32)[:, None]) & 1
+    ).astype(bool)
+
+
+TEMPER_MATRIX = _get_temper_matrix()
+
+
+def symbolic_identity() -> np.ndarray:
+    """
+    Get the symbolic initial state, where each bit of the state is its own
+    variable.
+
+    A symbolic state is an array of shape (624, 32, ROW_WORDS), where
+    [i, j] is the packed row of coefficients of bit j (LSB first) of word i.
+    """
+    state = np.zeros((N, WORD_BITS, ROW_WORDS), dtype=np.uint64)
+    var = np.arange(NUM_VARS)
+    state.reshape(NUM_VARS, ROW_WORDS)[var, var // 64] = np.uint64(1) << (
+        var % 64
+    ).astype(np.uint64)
+
+    return state
+
+
+def symbolic_twist(state: np.ndarray) -> None:
+    """
+    Twist a symbolic state in place, in the same slices as `mt19937.twist`.
+    """
+    a_bits = [j for j in range(WORD_BITS) if (int(MATRIX_A) >> j) & 1]
+
+    def twist_slice(start: int, end: int, src: int) -> None:
+        # x = (MT[i] & upper_mask) | (MT[i + 1] & lower_mask); bit 31 comes from
+        # MT[i] and the rest come from MT[i + 1]
+        x = np.empty((end - start, WORD_BITS, ROW_WORDS), dtype=np.uint64)
+        x[:, :31] = state[start + 1 : end + 1, :31]
+        x[:, 31] = state[start:end, 31]
+
+        # xA = x >> 1, then XOR in the constant wherever the low bit of x is set
+        xa = np.zeros_like(x)
+        xa[:, :31] = x[:, 1:]
+        xa[:, a_bits] ^= x[:, None, 0]
+
+        state[start:end] = state[src : src + (end - start)] ^ xa
+
+    for start, end in ((0, N - M), (N - M, 2 * (N - M)), (2 * (N - M), N - 1)):
+        twist_slice(start, end, (start + M) % N)
+
+    # The last word wraps around to the (already twisted) first word
+    last = np.empty((1, WORD_BITS, ROW_WORDS), dtype=np.uint64)
+    last[0, :31] = state[0, :31]
+    last[0, 31] = state[N - 1, 31]
+    xa = np.zeros_like(last)
+    xa[:, :31] = last[:, 1:]
+    xa[:, a_bits] ^= last[:, None, 0]
+    state[N - 1] = state[M - 1] ^ xa[0]
+
+
+def symbolic_temper(words: np.ndarray) -> np.ndarray:
+    """
+    Temper an array of symbolic words, of shape (n, 32, ROW_WORDS).
+    """
+    out = np.empty_like(words)
+    for i in range(WORD_BITS):
+        out[:, i] = np.bitwise_xor.reduce(words[:, TEMPER_MATRIX[i]], axis=1)
+
+    return out
+
+
+def _parity(words: np.ndarray) -> int:
+    """
+    Get the XOR of all the bits of an array of uint64s.
+    """
+    x = int(np.bitwise_xor.reduce(words))
+    return x.bit_count() & 1
+
+
+def solve(rows: np.ndarray) -> np.ndarray:
+    """
+    Solve a system of linear equations over GF(2) with Gaussian elimination.
+
+    :param rows: An array of shape (m, ROW_WORDS), where each row is the packed
+        coefficients of one equation followed by its right-hand side. This is
+        modified in place.
+    :returns: One solution, as an array of NUM_VARS bits. Variables that aren't
+        determined by the system are set to 0.
+    """
+    num_rows = len(rows)
+    rhs = NUM_VAR_WORDS
+
+    pivots: List[Tuple[int, int]] = []
+    rank = 0
+    for col in range(NUM_VARS):
+        if rank == num_rows:
+            break
+
+        word, bit = divmod(col, 64)
+        bit_mask = np.uint64(1) << np.uint64(bit)
+
+        candidates = np.flatnonzero(rows[rank:, word] & bit_mask) + rank
+        if len(candidates) == 0:
+            continue
+
+        # Prefer the candidate whose nonzero coefficients end the earliest, which
+        # keeps the equations from the first block (each of which only involves
+        # one word of the state) from spreading across the whole row. Since every
+        # column before this one has already been eliminated, only the words from
+        # here to the end of the pivot row need to be XOR'd into the others.
+        nonzero = rows[candidates, word:NUM_VAR_WORDS] != 0
+        ends = NUM_VAR_WORDS - np.argmax(nonzero[:, ::-1], axis=1)
+        best = np.argmin(ends)
+        pivot = candidates[best]
+        end = int(ends[best])
+
+        others = candidates[candidates != pivot]
+        if pivot != rank:
+            rows[[rank, pivot]] = rows[[pivot, rank]]
+            others[others == rank] = pivot
+
+        if len(others):
+            rows[others, word:end] ^= rows[rank, word:end]
+            rows[others, rhs] ^= rows[rank, rhs]
+
+        pivots.append((rank, col))
+        rank += 1
+
+    # Any equation left over with no coefficients must also have a right-hand side
+    # of 0, or nothing satisfies the system
+    if np.any(rows[rank:, rhs] & np.uint64(1)):
+        raise RuntimeError("The submitted outputs are inconsistent with MT19937")
+
+    # Back-substitute, from the last pivot to the first
+    solution = np.zeros(NUM_VAR_WORDS, dtype=np.uint64)
+    for row, col in reversed(pivots):
+        word, bit = divmod(col, 64)
+        value = (int(rows[row, rhs]) & 1) ^ _parity(rows[row, :rhs] & solution)
+        if value:
+            solution[word] |= np.uint64(1) << np.uint64(bit)
+
+    bits = np.unpackbits(solution.view(np.uint8), bitorder="little")
+    return bits[:NUM_VARS]
+
+
+class LinearUntwister:
+    """
+    Clone the state of a Mersenne Twister from (possibly partial) outputs, by
+    solving a linear system over GF(2).
+    """
+
+    def __init__(self):
+        # The symbolic state of the current block of outputs, relative to the
+        # initial state
+        self.MT = symbolic_identity()
+        self.index = 0
+        self.twists = 0
+
+        # The known bits of each output in the current block
+        self.masks = np.zeros(N, dtype=np.uint32)
+        self.values = np.zeros(N, dtype=np.uint32)
+
+        # Packed equations from blocks that have already been twisted away
+        self.equations: List[np.ndarray] = []
+
+    def _get_block_equations(self) -> np.ndarray:
+        """
+        Turn the known bits of the outputs submitted for the current block into
+        packed equations.
+        """
+        used = np.flatnonzero(self.masks[: self.index])
+
+        tempered = symbolic_temper(self.MT[used])
+        masks = self.masks[used]
+        values = self.values[used]
+
+        bits = np.arange(WORD_BITS, dtype=np.uint32)
+        known = ((masks[:, None] >> bits) & 1).astype(bool)
+        rhs = ((values[:, None] >> bits) & 1).astype(np.uint64)
+
+        rows = tempered[known]
+        rows[:, NUM_VAR_WORDS] ^= rhs[known]
+        return rows
+
+    def submit(self, guess: str) -> None:
+        """
+        Submit the next output, as a string like "?1100???1001000??0?100?10??10010"
+        where ? represents an unknown bit.
+
+        You need 624 numbers to completely clone the state. You can input less
+        than that though and this will give you the best guess for the state.
+        """
+        mask, value = parse_guess(guess)
+
+        if self.index >= N:
+            self._next_block()
+
+        self.masks[self.index] = mask
+        self.values[self.index] = value & mask
+        self.index += 1
+
+    def submit_many(self, words: np.ndarray, mask: Optional[np.ndarray] = None) -> None:
+        """
+        Submit an array of outputs at once, like a `'<u4'` view of a keystream,
+        the same as `stt.Untwister.submit_many`. `mask` gives the known bits of
+        every word, or of each word; by default, every bit is known.
+        """
+        masks, values = parse_words(words, mask)
+
+        while len(masks):
+            if self.index >= N:
+                self._next_block()
+
+            count = min(N - self.index, len(masks))
+            self.masks[self.index : self.index + count] = masks[:count]
+            self.values[self.index : self.index + count] = values[:count]
+            self.index += count
+            masks, values = masks[count:], values[count:]
+
+    def _next_block(self) -> None:
+        """
+        Turn the current block into equations and move on to the next one.
+        """
+        self.equations.append(self._get_block_equations())
+        symbolic_twist(self.MT)
+        self.twists += 1
+        self.masks[:] = 0
+        self.values[:] = 0
+        self.index = 0
+
+    def get_random(self) -> Random:
+        """
+        This will give you a random.Random() instance with the cloned state.
+        """
+        logger.debug("Solving...")
+        start = time()
+
+        rows = np.concatenate(self.equations + [self._get_block_equations()])
+        logger.debug(f"Solving {len(rows)} equations in {NUM_VARS} variables")
+
+        bits = solve(rows)
+
+        # Rebuild the initial state from the solution, then twist it forward to
+        # the current block
+        words = np.packbits(bits.reshape(N, WORD_BITS), axis=1, bitorder="little").view(
+            "<u4"
+        )
+        state = words.reshape(N).astype(np.uint32)
+        for _ in range(self.twists):
+            twist(state)
+
+        end = time()
+        logger.debug(f"Solved! (in {round(end - start, 3)}s)")
+
+        r = Random()
+        r.setstate((3, tuple(int(x) for x in state) + (self.index,), None))
+        return r
+
+
+def test():
+    """
+    The same test as `stt.test()`: clone Python random's internal state, given
+    partial output from getrandbits.
+    """
+    r1 = Random()
+    ut = LinearUntwister()
+    for _ in range(1337):
+        random_num = r1.getrandbits(16)
+        # Just send stuff like "?11????0011?0110??01110????01???"
+        # Where ? represents unknown bits
+        ut.submit(bin(random_num)[2:] + "?" * 16)
+
+    r2 = ut.get_random()
+    for _ in range(624):
+        assert r1.getrandbits(32) == r2.getrandbits(32)
+
+    logger.debug("Test passed!")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="GF2> %(message)s", level=logging.DEBUG)
+    test()
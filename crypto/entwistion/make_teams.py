@@ -0,0 +1,281 @@
+"""
+Make a separate entwistion instance for every team, so that one team's solution
+(or leaked flag image) doesn't work for anyone else.
+
+Each team's seed is derived from a master secret and its team ID with
+HMAC-SHA256, so any instance can be regenerated from the secret alone, but no
+team can work out another's seed from its own. Every instance gets its own
+`random.Random`, so they're independent of each other (and of the module-global
+`random`) and can be made in parallel. Each one is then checked with the same
+fast path as solve.py: recover the state from the first 624 words of the
+corgi, and make sure the rest of both files follow from it.
+
+The teams file is a CSV with a `team_id` column, and optionally a `flag_file`
+column for a different flag image per team (relative to the CSV).
+
+The manifest of seeds, output hashes and timings is written next to the teams
+file (not in the output directory, which gets handed out), since each seed gives
+away that team's whole key stream.
+
+    ENTWISTION_MASTER_SECRET=... python make_teams.py teams.csv --output-dir teams
+    python make_teams.py teams.csv --master-secret-file secret.txt -j 8
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import hmac
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from mt19937 import MT19937, check_xor_file
+from solve import RECOVERY_BYTES, recover_random
+
+DEFAULT_PLAINTEXT_FILE = Path("corgi.jpg")
+DEFAULT_FLAG_FILE = Path("flag.png")
+
+MASTER_SECRET_VARIABLE = "ENTWISTION_MASTER_SECRET"
+
+# Team IDs become directory names
+TEAM_ID_PATTERN = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*")
+
+
+def load_entwistion():
+    """
+    Import entwistion-dev.py, which can't be imported the usual way because of
+    the dash in its name.
+    """
+    spec = importlib.util.spec_from_file_location(
+        "entwistion_dev", Path(__file__).with_name("entwistion-dev.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def derive_seed(master_secret: bytes, team_id: str) -> str:
+    """
+    Derive a team's seed from the master secret, as a hex string (which
+    `random.Random` accepts as-is).
+    """
+    return hmac.new(master_secret, b"entwistion/" + team_id.encode(), hashlib.sha256).hexdigest()
+
+
+def read_teams(teams_path: Path) -> List[Tuple[str, Optional[Path]]]:
+    """
+    Read the teams file.
+
+    :returns: A list of (team id, flag file or None for the default) tuples.
+    """
+    teams = []
+    with open(teams_path, newline="") as fp:
+        for row in csv.DictReader(fp):
+            team_id = row["team_id"].strip()
+            if not TEAM_ID_PATTERN.fullmatch(team_id):
+                raise ValueError(f"{team_id!r} isn't a valid team ID")
+
+            flag_file = (row.get("flag_file") or "").strip()
+            teams.append((team_id, teams_path.parent / flag_file if flag_file else None))
+
+    team_ids = [team_id for team_id, _ in teams]
+    if len(set(team_ids)) != len(team_ids):
+        raise ValueError(f"{teams_path} contains duplicate team IDs")
+
+    return teams
+
+
+def _sha256_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while block := fp.read(2**20):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def verify_instance(
+    plaintext_file: Path, plaintext_twist: Path, flag_file: Path, flag_twist: Path
+) -> bool:
+    """
+    Solve an instance the way solve.py does, and check that it gives back the
+    flag.
+    """
+    mt = MT19937.from_random(recover_random(plaintext_file, plaintext_twist))
+    return check_xor_file(
+        plaintext_file, plaintext_twist, mt, start=RECOVERY_BYTES
+    ) and check_xor_file(flag_file, flag_twist, mt)
+
+
+def make_team_instance(
+    team_id: str, seed: str, plaintext_file: Path, flag_file: Path, team_dir: Path
+) -> dict:
+    """
+    Create and verify a single team's pair of .twist files.
+
+    This runs in a worker process.
+
+    :returns: A summary of the instance, suitable for dumping to JSON.
+    """
+    plaintext_twist = team_dir / (plaintext_file.name + ".twist")
+    flag_twist = team_dir / (flag_file.name + ".twist")
+    if plaintext_twist == flag_twist:
+        raise ValueError("The plaintext and flag files need different names")
+
+    entwistion = load_entwistion()
+    team_dir.mkdir(parents=True, exist_ok=True)
+
+    # The state is shared between the two files, the same as in the original
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    entwistion.entwist_file(plaintext_file, plaintext_twist, rng)
+    entwistion.entwist_file(flag_file, flag_twist, rng)
+    generate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if not verify_instance(plaintext_file, plaintext_twist, flag_file, flag_twist):
+        raise RuntimeError(f"Team {team_id}'s instance doesn't solve back to its flag")
+    verify_time = time.perf_counter() - start
+
+    return {
+        "team_id": team_id,
+        "seed": seed,
+        "plaintext_file": str(plaintext_file),
+        "flag_file": str(flag_file),
+        "outputs": {str(path): _sha256_file(path) for path in (plaintext_twist, flag_twist)},
+        "generate_seconds": round(generate_time, 6),
+        "verify_seconds": round(verify_time, 6),
+    }
+
+
+def get_master_secret(args: argparse.Namespace) -> bytes:
+    if args.master_secret_file is not None:
+        secret = args.master_secret_file.read_bytes().strip()
+    else:
+        secret = os.environ.get(MASTER_SECRET_VARIABLE, "").encode()
+
+    if not secret:
+        raise ValueError(
+            f"Pass --master-secret-file or set {MASTER_SECRET_VARIABLE} to the master secret"
+        )
+    return secret
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Creates and verifies an entwistion instance per team."
+    )
+
+    parser.add_argument(
+        "teams_file",
+        type=Path,
+        help="A CSV file with a team_id column, and optionally a flag_file column.",
+    )
+    parser.add_argument(
+        "--master-secret-file",
+        type=Path,
+        help=f"A file containing the master secret (default: ${MASTER_SECRET_VARIABLE}).",
+    )
+    parser.add_argument(
+        "--plaintext-file",
+        type=Path,
+        default=DEFAULT_PLAINTEXT_FILE,
+        help="The known plaintext given to every team (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--flag-file",
+        type=Path,
+        default=DEFAULT_FLAG_FILE,
+        help="The flag image, for teams without their own (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=Path("teams"),
+        help="Where to write each team's files, as <output-dir>/<team_id>/ "
+        "(default: %(default)s).",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help="Where to write the JSON manifest of seeds, hashes and timings. Keep it out "
+        "of the output directory: each seed gives away that team's key stream "
+        "(default: <teams file>.manifest.json, next to the teams file).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="The number of worker processes (default: one per CPU).",
+    )
+
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    master_secret = get_master_secret(args)
+    teams = read_teams(args.teams_file)
+    manifest_path = args.manifest or args.teams_file.with_name(
+        args.teams_file.stem + ".manifest.json"
+    )
+    if args.output_dir.resolve() in manifest_path.resolve().parents:
+        print(
+            f"Warning: {manifest_path} is inside {args.output_dir}, so anyone given the "
+            "whole directory can recover every team's flag from the seeds in it"
+        )
+
+    print(f"Creating entwistion instances for {len(teams)} teams in {args.output_dir}")
+
+    start = time.perf_counter()
+    results = {}
+    failed = False
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {
+            executor.submit(
+                make_team_instance,
+                team_id,
+                derive_seed(master_secret, team_id),
+                args.plaintext_file,
+                flag_file or args.flag_file,
+                args.output_dir / team_id,
+            ): team_id
+            for team_id, flag_file in teams
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            team_id = futures[future]
+            try:
+                results[team_id] = future.result()
+            except Exception as e:
+                print(f"Failed to create the instance for team {team_id}: {e}")
+                results[team_id] = {"team_id": team_id, "error": str(e)}
+                failed = True
+
+    total_time = time.perf_counter() - start
+
+    # Keep the manifest in the same order as the teams file
+    manifest = {
+        "total_seconds": round(total_time, 6),
+        "teams": [results[team_id] for team_id, _ in teams],
+    }
+
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(manifest_path, "w") as fp:
+        json.dump(manifest, fp, indent=2)
+
+    print(f"Wrote manifest to {manifest_path} ({round(total_time, 3)}s total)")
+
+    if failed:
+        print("Some instances failed to generate or verify")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(get_args())
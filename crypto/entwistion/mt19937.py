@@ -0,0 +1,437 @@
+"""
+A NumPy implementation of MT19937 that produces exactly the same outputs as
+Python's `random` module.
+
+`random.randbytes()` is fine for a picture or two, but it builds the whole key
+as one enormous Python integer first. This generates the same keystream in
+624-word blocks with NumPy, and can write it straight into an existing buffer.
+
+The state is interchangeable with `random.Random`:
+
+    r = random.Random(SEED)
+    mt = MT19937.from_random(r)
+    assert mt.randbytes(100) == r.randbytes(100)
+    r.setstate(mt.getstate())
+"""
+
+import mmap
+import os
+import random
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+N = 624
+M = 397
+MATRIX_A = np.uint32(0x9908B0DF)
+UPPER_MASK = np.uint32(0x80000000)
+LOWER_MASK = np.uint32(0x7FFFFFFF)
+
+# The number of words tempered at once. Twisting has to happen one block at a
+# time, but tempering doesn't, so we temper in bigger batches to cut down on the
+# number of NumPy calls.
+TEMPER_BATCH_WORDS = N * 256
+
+# The number of bytes XOR'd at a time when streaming files. This has to be a
+# multiple of 4 so that consecutive blocks continue the same keystream.
+DEFAULT_BLOCK_SIZE = 4 * 2**20
+
+
+def twist(mt: np.ndarray) -> None:
+    """
+    Advance a 624-word MT19937 state in place.
+
+    The reference implementation updates the state one word at a time, where
+    word i depends on words i + 1 and i + 397 (mod 624). The later words depend
+    on words that have already been updated in the same pass, so this does it in
+    three slices (plus the last word), each of which only depends on words that
+    are already final.
+    """
+    for start, end in ((0, N - M), (N - M, 2 * (N - M)), (2 * (N - M), N - 1)):
+        src = (start + M) % N
+        y = (mt[start:end] & UPPER_MASK) | (mt[start + 1 : end + 1] & LOWER_MASK)
+        mt[start:end] = mt[src : src + (end - start)] ^ (y >> 1) ^ ((y & 1) * MATRIX_A)
+
+    y = (mt[N - 1] & UPPER_MASK) | (mt[0] & LOWER_MASK)
+    mt[N - 1] = mt[M - 1] ^ (y >> 1) ^ ((y & 1) * MATRIX_A)
+
+
+def temper(y: np.ndarray) -> None:
+    """
+    Temper an array of raw MT19937 state words in place.
+    """
+    y ^= y >> 11
+    y ^= (y << 7) & np.uint32(0x9D2C5680)
+    y ^= (y << 15) & np.uint32(0xEFC60000)
+    y ^= y >> 18
+
+
+def untemper(y: np.ndarray) -> None:
+    """
+    Undo `temper` on an array of 32-bit outputs in place, giving back the raw
+    state words they came from.
+    """
+    y ^= y >> 18
+    y ^= (y << 15) & np.uint32(0xEFC60000)
+
+    # Each pass recovers 7 more of the low bits
+    x = y.copy()
+    for _ in range(4):
+        x = y ^ ((x << 7) & np.uint32(0x9D2C5680))
+
+    y[:] = x
+    y ^= (y >> 11) ^ (y >> 22)
+
+
+# What the untwisters (stt.py and gf2.py) accept as outputs. They both parse them
+# here, so they accept exactly the same inputs.
+
+WORD_BITS = 32
+WORD_MASK = 2**WORD_BITS - 1
+
+GUESS_ERROR = (
+    'Must pass a string like "?1100???1001000??0?100?10??10010" where ? represents'
+    " an unknown bit"
+)
+
+
+def check_guess(guess: str) -> None:
+    """
+    Check that `guess` is an output with unknown bits, like
+    "?1100???1001000??0?100?10??10010", where ? represents an unknown bit. It can
+    be shorter than 32 bits, in which case the top bits are 0.
+
+    If it isn't, this raises ValueError.
+    """
+    if type(guess) != str or not all(bit in "01?" for bit in guess):
+        raise ValueError(GUESS_ERROR)
+    if len(guess) > WORD_BITS:
+        raise ValueError("One 32-bit number at a time please")
+
+
+def parse_guess(guess: str) -> Tuple[int, int]:
+    """
+    Check and parse a guess (see `check_guess`).
+
+    :returns: A tuple of a mask of the known bits and their values.
+    """
+    check_guess(guess)
+    guess = guess.zfill(WORD_BITS)
+    mask = int(guess.replace("0", "1").replace("?", "0"), 2)
+    value = int(guess.replace("?", "0"), 2)
+    return mask, value
+
+
+def format_guess(mask: int, value: int) -> str:
+    """
+    The opposite of `parse_guess`: turn a mask of known bits and their values back
+    into a guess.
+    """
+    return "".join(
+        str(value >> i & 1) if mask >> i & 1 else "?"
+        for i in range(WORD_BITS - 1, -1, -1)
+    )
+
+
+def check_words(words) -> np.ndarray:
+    """
+    Check that `words` is an array (or scalar) of 32-bit unsigned integers, and
+    flatten it to a uint32 array, without copying if it already is one.
+
+    If it isn't, this raises ValueError.
+    """
+    words = np.asarray(words)
+    if words.dtype.kind not in "ui":
+        raise ValueError("Must pass an array of integers")
+    if words.dtype.kind == "i" or words.dtype.itemsize > 4:
+        if words.size and (words.min() < 0 or words.max() > WORD_MASK):
+            raise ValueError("One 32-bit number per word please")
+    return words.astype(np.uint32, copy=False).ravel()
+
+
+def parse_words(words, mask=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Check an array of outputs (see `check_words`), along with their known bits:
+    either one mask for every word, or one per word. By default, every bit is
+    known.
+
+    :returns: A tuple of flat uint32 arrays of the masks and the known values.
+    """
+    words = check_words(words)
+    masks = check_words(WORD_MASK if mask is None else mask)
+    if masks.size == 1:
+        masks = np.broadcast_to(masks, words.shape)
+    if masks.size != words.size:
+        raise ValueError("Must pass one mask, or one mask per word")
+
+    return masks, words & masks
+
+
+class MT19937:
+    """
+    A Mersenne Twister whose outputs are identical to `random.Random`'s.
+    """
+
+    def __init__(self, state: Optional[Tuple] = None):
+        """
+        Create a generator.
+
+        :param state: A state as returned by `random.getstate()`. If None, the
+            generator is seeded the same way as `random.Random()`.
+        """
+        self.mt = np.zeros(N, dtype=np.uint32)
+        self.index = N
+        self.setstate(state if state is not None else random.Random().getstate())
+
+    @classmethod
+    def from_seed(cls, seed) -> "MT19937":
+        """
+        Create a generator in the same state as `random.Random(seed)`.
+        """
+        return cls(random.Random(seed).getstate())
+
+    @classmethod
+    def from_random(cls, r: random.Random) -> "MT19937":
+        """
+        Create a generator in the same state as an existing `random.Random`.
+        """
+        return cls(r.getstate())
+
+    def getstate(self) -> Tuple:
+        """
+        Get the state of the generator, in the format of `random.getstate()`.
+        """
+        return (3, tuple(int(x) for x in self.mt) + (self.index,), None)
+
+    def setstate(self, state: Tuple) -> None:
+        """
+        Set the state of the generator from the output of `random.getstate()`.
+        """
+        version, internal_state, _ = state
+        if version != 3 or len(internal_state) != N + 1:
+            raise ValueError("State is not a random.Random (version 3) state")
+
+        index = internal_state[-1]
+        if not 0 <= index <= N:
+            raise ValueError(f"State index {index} is out of range")
+
+        self.mt[:] = internal_state[:-1]
+        self.index = index
+
+    def fill_words(self, out: np.ndarray) -> None:
+        """
+        Fill an array of 32-bit words with successive outputs, in place.
+
+        This is the same sequence of values as calling `random.getrandbits(32)`
+        once per element.
+        """
+        if out.ndim != 1 or out.dtype.itemsize != 4 or out.dtype.kind != "u":
+            raise TypeError("Output must be a one-dimensional uint32 array")
+
+        n = len(out)
+        pos = 0
+        while pos < n:
+            if self.index >= N:
+                twist(self.mt)
+                self.index = 0
+
+            count = min(N - self.index, n - pos)
+            out[pos : pos + count] = self.mt[self.index : self.index + count]
+            self.index += count
+            pos += count
+
+        # Temper in batches. If `out` is something like a little-endian view over
+        # a byte buffer on a big-endian machine, temper a native copy instead.
+        for start in range(0, n, TEMPER_BATCH_WORDS):
+            batch = out[start : start + TEMPER_BATCH_WORDS]
+            if batch.dtype.isnative:
+                temper(batch)
+            else:
+                native = batch.astype(np.uint32)
+                temper(native)
+                batch[:] = native
+
+    def random_words(self, n: int) -> np.ndarray:
+        """
+        Return an array of `n` successive 32-bit outputs.
+        """
+        out = np.empty(n, dtype=np.uint32)
+        self.fill_words(out)
+        return out
+
+    def getrandbits(self, k: int) -> int:
+        """
+        Equivalent to `random.getrandbits(k)`.
+        """
+        if k < 0:
+            raise ValueError("Number of bits must be non-negative")
+        if k == 0:
+            return 0
+
+        words = self.random_words((k - 1) // 32 + 1)
+
+        # The final word only keeps its most significant bits
+        if k % 32:
+            words[-1] >>= 32 - (k % 32)
+
+        return int.from_bytes(words.astype("<u4").tobytes(), "little")
+
+    def fill_bytes(self, buf) -> None:
+        """
+        Fill a writable buffer (e.g. a bytearray, mmap or uint8 array) with
+        random bytes, in place.
+
+        This gives the same bytes as `random.randbytes(len(buf))`. Note that like
+        `randbytes`, a length that isn't a multiple of 4 consumes a whole word for
+        the last few bytes, so filling two buffers back to back only continues the
+        same keystream if the first one's length is a multiple of 4.
+        """
+        out = np.frombuffer(buf, dtype=np.uint8)
+        if not out.flags.writeable:
+            raise TypeError("Output buffer must be writable")
+
+        full_words, remainder = divmod(len(out), 4)
+        self.fill_words(out[: full_words * 4].view("<u4"))
+
+        if remainder:
+            # The last few bytes come from the most significant end of a word
+            word = int(self.random_words(1)[0]) >> (32 - 8 * remainder)
+            out[full_words * 4 :] = np.frombuffer(
+                word.to_bytes(remainder, "little"), dtype=np.uint8
+            )
+
+    def randbytes(self, n: int) -> bytes:
+        """
+        Equivalent to `random.randbytes(n)`.
+        """
+        buf = bytearray(n)
+        self.fill_bytes(buf)
+        return bytes(buf)
+
+
+def _release_pages(mm: mmap.mmap, start: int, length: int) -> None:
+    """
+    Tell the OS that we're done with part of a memory map, so that the pages
+    we've already processed don't keep counting towards our memory use.
+
+    This is only a hint (and only available on some platforms); the data is still
+    in the file, and writes to shared mappings aren't lost.
+
+    `madvise` needs a page-aligned start, so the range is widened back to the
+    start of its first page (the blocks are processed in order, so anything
+    before `start` is already done with) and cut off at the end of its last whole
+    page, which is released along with the next block instead.
+    """
+    if not hasattr(mmap, "MADV_DONTNEED"):
+        return
+
+    lo = start // mmap.PAGESIZE * mmap.PAGESIZE
+    hi = (start + length) // mmap.PAGESIZE * mmap.PAGESIZE
+    if hi > lo:
+        mm.madvise(mmap.MADV_DONTNEED, lo, hi - lo)
+
+
+def _check_block_size(block_size: int) -> None:
+    if block_size <= 0 or block_size % 4:
+        raise ValueError(f"Block size must be a positive multiple of 4 ({block_size})")
+
+
+def xor_file(
+    input_file: Path,
+    output_file: Path,
+    mt: MT19937,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> None:
+    """
+    XOR a file with the keystream from `mt`, writing the result to `output_file`.
+
+    Both files are memory-mapped and processed `block_size` bytes at a time with
+    a single reusable key buffer, so memory use doesn't depend on the size of the
+    file. The keystream is the same as `random.randbytes(size of the file)`, and
+    `mt` is left in the same state that call would leave it in.
+    """
+    _check_block_size(block_size)
+
+    with open(input_file, "rb") as in_fp, open(output_file, "w+b") as out_fp:
+        size = os.fstat(in_fp.fileno()).st_size
+        out_fp.truncate(size)
+
+        # mmap refuses to map empty files, but there's nothing to do anyway
+        if size == 0:
+            return
+
+        with mmap.mmap(in_fp.fileno(), 0, access=mmap.ACCESS_READ) as in_mm:
+            with mmap.mmap(out_fp.fileno(), 0) as out_mm:
+                _xor_blocks(in_mm, out_mm, size, mt, block_size)
+                out_mm.flush()
+
+
+def _xor_blocks(src, dst, size: int, mt: MT19937, block_size: int) -> None:
+    # Kept separate from `xor_file` so that every array over the memory maps is
+    # gone by the time they're closed.
+    key = np.empty(min(block_size, size), dtype=np.uint8)
+    for start in range(0, size, block_size):
+        count = min(block_size, size - start)
+        block_key = key[:count]
+        mt.fill_bytes(block_key)
+
+        src_block = np.frombuffer(src, dtype=np.uint8, count=count, offset=start)
+        dst_block = np.frombuffer(dst, dtype=np.uint8, count=count, offset=start)
+        np.bitwise_xor(src_block, block_key, out=dst_block)
+
+        del src_block, dst_block
+        _release_pages(src, start, count)
+        _release_pages(dst, start, count)
+
+
+def check_xor_file(
+    plaintext_file: Path,
+    ciphertext_file: Path,
+    mt: MT19937,
+    start: int = 0,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> bool:
+    """
+    Check that the bytes of two files, XOR'd together from offset `start` onwards,
+    are the keystream from `mt`.
+
+    Like `xor_file`, this streams both files through memory maps. `start` must be
+    a multiple of 4, since the keystream can't be resumed partway into a word.
+    """
+    _check_block_size(block_size)
+    if start % 4:
+        raise ValueError(f"Start offset must be a multiple of 4 ({start})")
+
+    with open(plaintext_file, "rb") as pt_fp, open(ciphertext_file, "rb") as ct_fp:
+        size = os.fstat(pt_fp.fileno()).st_size
+        if size != os.fstat(ct_fp.fileno()).st_size:
+            return False
+
+        if start >= size:
+            return True
+
+        with mmap.mmap(pt_fp.fileno(), 0, access=mmap.ACCESS_READ) as pt_mm:
+            with mmap.mmap(ct_fp.fileno(), 0, access=mmap.ACCESS_READ) as ct_mm:
+                return _check_blocks(pt_mm, ct_mm, start, size, mt, block_size)
+
+
+def _check_blocks(pt, ct, start: int, size: int, mt: MT19937, block_size: int) -> bool:
+    key = np.empty(min(block_size, size - start), dtype=np.uint8)
+    scratch = np.empty_like(key)
+    for offset in range(start, size, block_size):
+        count = min(block_size, size - offset)
+        block_key = key[:count]
+        mt.fill_bytes(block_key)
+
+        pt_block = np.frombuffer(pt, dtype=np.uint8, count=count, offset=offset)
+        ct_block = np.frombuffer(ct, dtype=np.uint8, count=count, offset=offset)
+        np.bitwise_xor(pt_block, ct_block, out=scratch[:count])
+        if not np.array_equal(scratch[:count], block_key):
+            return False
+
+        del pt_block, ct_block
+        _release_pages(pt, offset, count)
+        _release_pages(ct, offset, count)
+
+    return True
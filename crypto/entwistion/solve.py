@@ -1,7 +1,10 @@
+from random import Random
+
 import numpy as np
 
 # From https://github.com/icemonster/symbolic_mersenne_cracker/blob/main/main.py
 from stt import Untwister
+from mt19937 import MT19937, check_xor_file, xor_file
 
 PT_FILE_1 = "corgi.jpg"
 CT_FILE_1 = "corgi.jpg.twist"
@@ -10,50 +13,54 @@ CT_FILE_2 = "flag.png.twist"
 
 FLAG_PATH = "flag_solved.png"
 
-def main() -> None:
-    with open(PT_FILE_1, "rb") as fp:
-        pt_1 = np.frombuffer(fp.read(), dtype=np.uint8)
+# 624 32-bit outputs are enough to recover the state in full
+RECOVERY_BYTES = 624 * 4
 
-    with open(CT_FILE_1, "rb") as fp:
-        ct_1 = np.frombuffer(fp.read(), dtype=np.uint8)
+def recover_random(pt_file, ct_file) -> Random:
+    """
+    Clone the state of the generator that encrypted `pt_file` into `ct_file`, as of
+    the first RECOVERY_BYTES bytes of the keystream.
+    """
+    # We only need the start of the known plaintext/ciphertext pair to recover the
+    # state; the rest of the files are streamed later on
+    with open(pt_file, "rb") as fp:
+        pt_1 = np.frombuffer(fp.read(RECOVERY_BYTES), dtype=np.uint8)
 
-    with open(CT_FILE_2, "rb") as fp:
-        ct_2 = np.frombuffer(fp.read(), dtype=np.uint8)
+    with open(ct_file, "rb") as fp:
+        ct_1 = np.frombuffer(fp.read(RECOVERY_BYTES), dtype=np.uint8)
 
     # Start off by deriving the key by simply XOR'ing the ciphertext against
-    # the plaintext - get it back as `bytes`
-    key_1 = (pt_1 ^ ct_1).tobytes()
+    # the plaintext
+    key_1 = pt_1 ^ ct_1
 
-    # Submit the first 624 instances of 32-bit results to the Z3 solver as strings
-    # of 1s and 0s
+    # Submit the first 624 instances of 32-bit results to the solver all at once,
+    # by viewing the key as little-endian 32-bit integers (which is how
+    # randbytes() lays them out). Every bit is known, so there's no mask.
     ut = Untwister()
-    for i in range(624):
-        # Grab 4 bytes, then turn them into little-endian integers before converting
-        # them into bitstrings. Note that we don't need to manually pad this, as
-        # Untwister will automatically pad with 0s as necessary.
-        observation = int.from_bytes(key_1[(i)*4:(i+1)*4], "little")
-        ut.submit(bin(observation)[2:])
+    ut.submit_many(key_1.view("<u4"))
 
     # Solve and clone state (hopefully - if this raises an error we've done
     # something wrong)
     #
-    # Depending on how lucky/unlucky you are, this might take a *really* long time,
-    # but I assure you that this works
-    r = ut.get_random()
+    # Since all 624 outputs are fully known, Untwister can just untemper them
+    # without going through Z3. With partial outputs, depending on how lucky/unlucky
+    # you are, this might take a *really* long time, but I assure you that this works
+    return ut.get_random()
 
-    # For the remainder of the file, make sure that we're getting the same
-    # outputs as the random number generator
-    assert np.array_equal(r.randbytes(len(key_1) - 624*4), key_1[624*4:])
+def main() -> None:
+    r = recover_random(PT_FILE_1, CT_FILE_1)
 
-    # Now grab as many bytes as is necessary to decrypt the flag file from
-    # the now-synchronized instance
-    key = np.frombuffer(r.randbytes(len(ct_2)), dtype=np.uint8)
+    # Switch over to the NumPy generator for the (potentially very long) checks,
+    # starting from the cloned state
+    mt = MT19937.from_random(r)
 
-    # XOR it and write out the flag
-    flag = (ct_2 ^ key).tobytes()
+    # For the remainder of the file, make sure that we're getting the same
+    # outputs as the random number generator
+    assert check_xor_file(PT_FILE_1, CT_FILE_1, mt, start=RECOVERY_BYTES)
 
-    with open(FLAG_PATH, "wb") as fp:
-        fp.write(flag)
+    # Now XOR the flag file with as many bytes as are necessary from the
+    # now-synchronized instance, streaming the result out to disk
+    xor_file(CT_FILE_2, FLAG_PATH, mt)
 
 
 if __name__ == "__main__":
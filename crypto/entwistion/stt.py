@@ -11,6 +11,12 @@ from random import Random
 from itertools import count
 from time import time
 import logging
+import multiprocessing
+import os
+
+import numpy as np
+
+from mt19937 import MT19937, untemper, twist, check_guess, parse_guess, format_guess, parse_words
 
 logging.basicConfig(format='STT> %(message)s')
 logger = logging.getLogger()
@@ -18,16 +24,151 @@ logger.setLevel(logging.DEBUG)
 
 SYMBOLIC_COUNTER = count()
 
+# The number of bits in the state; you need at least this many known output bits
+# before the state can be pinned down
+STATE_BITS = 624 * 32
+
+# Solver configurations raced against each other by get_random(portfolio=...). How long a
+# partial-output recovery takes varies a lot with the search order, so a few differently
+# seeded/tuned copies of the same problem usually finish well before the slowest would.
+PORTFOLIO_CONFIGS = [
+    {},
+    {'random_seed': 1, 'phase': 'random'},
+    {'random_seed': 2, 'restart': 'luby'},
+    {'random_seed': 3, 'branching.heuristic': 'chb'},
+    {'random_seed': 4, 'phase': 'random', 'restart': 'geometric'},
+    {'random_seed': 5},
+]
+
+# Portfolio solving is opt-in, since it spawns processes (1 means no portfolio). On a machine with
+# more than one CPU, get_cpu_portfolio() races as many configurations as there are CPUs.
+DEFAULT_PORTFOLIO = 1
+
+def get_cpu_portfolio():
+    '''
+        Get a portfolio size for get_random() that uses every CPU, up to the number of
+        PORTFOLIO_CONFIGS.
+    '''
+    return min(os.cpu_count() or 1, len(PORTFOLIO_CONFIGS))
+
+# Templates for a whole twist and for one tempered output, built once per process by
+# get_templates() and then copied for each block/output with z3.substitute
+TEMPLATES = None
+
+def get_templates(n=624, m=397, upper_mask=0x80000000, lower_mask=0x7FFFFFFF, a=0x9908B0DF):
+    '''
+        Build (or get the already-built) templates for:
+        - a whole twist: And(next_MT[i] == MT[i + m] ^ twist(MT[i], MT[i + 1]) ...), where words that
+          depend on already-twisted words refer to those words in next_MT instead of repeating their
+          expressions
+        - one output: (temper(y) & mask) == value
+
+        Returns a tuple of the twist template, its variables (MT, next_MT), the output template and
+        its variables (y, mask, value).
+    '''
+    global TEMPLATES
+    if TEMPLATES is None:
+        MT = [BitVec(f'tmpl_MT_{i}', 32) for i in range(n)]
+        next_MT = [BitVec(f'tmpl_next_MT_{i}', 32) for i in range(n)]
+
+        twist = []
+        for i in range(n):
+            nxt = MT[i + 1] if i + 1 < n else next_MT[0]
+            src = MT[i + m] if i + m < n else next_MT[i + m - n]
+            x = (MT[i] & upper_mask) | (nxt & lower_mask)
+            xA = LShR(x, 1)
+            twist.append(next_MT[i] == src ^ If(x & 1 == 0, xA, xA ^ a))
+
+        y, mask, value = BitVecs('tmpl_y tmpl_mask tmpl_value', 32)
+        y1 = y ^ LShR(y, 11)
+        y2 = y1 ^ ((y1 << 7) & 0x9D2C5680)
+        y3 = y2 ^ ((y2 << 15) & 0xEFC60000)
+        output = (y3 ^ LShR(y3, 18)) & mask == value
+
+        TEMPLATES = (And(twist), (MT, next_MT), output, (y, mask, value))
+
+    return TEMPLATES
+
+def get_portfolio_configs(n):
+    '''
+        Get n solver configurations for portfolio solving; past the end of PORTFOLIO_CONFIGS, the
+        rest just use different random seeds.
+    '''
+    return [PORTFOLIO_CONFIGS[i] if i < len(PORTFOLIO_CONFIGS) else {'random_seed': i} for i in range(n)]
+
+def solve_portfolio_config(job):
+    '''
+        Portfolio worker: solve the constraints (as SMT-LIB text, since Z3 objects can't be sent
+        between processes) with one solver configuration.
+
+        Returns the configuration, the values of the named variables (or None if the solver didn't
+        find a model), how long it took and the solver's statistics.
+    '''
+    constraints, names, config = job
+    start = time()
+
+    # Everything here is a bit-vector formula, whichever way it was built
+    solver = SolverFor('QF_BV')
+    for key, value in config.items():
+        solver.set(key, value)
+    solver.from_string(constraints)
+
+    result = solver.check()
+    seconds = time() - start
+    statistics = get_statistics(solver)
+    if result != sat:
+        return config, None, seconds, statistics
+
+    model = solver.model()
+    values = {decl.name(): model[decl].as_long() for decl in model.decls()}
+    return config, [values.get(name, 0) for name in names], seconds, statistics
+
+def get_statistics(solver):
+    '''
+        Get Z3's statistics for the last check of solver, as a dict.
+    '''
+    statistics = solver.statistics()
+    return {key: statistics.get_key_value(key) for key in statistics.keys()}
+
+def matches_guesses(r, masks, values):
+    '''
+        Check (and consume) the next outputs of r against lists of known bits and their values.
+    '''
+    for mask, value in zip(masks, values):
+        if r.getrandbits(32) & mask != value:
+            return False
+    return True
+
 class Untwister:
-    def __init__(self):
+    def __init__(self, fast_path=True, use_templates=True):
         name = next(SYMBOLIC_COUNTER)
         self.MT = [BitVec(f'MT_{i}_{name}', 32) for i in range(624)]
         self.index = 0
-        self.solver = Solver()
+
+        # The templated constraints are plain bit-vector formulas, so they can go straight to the
+        # bit-blasting QF_BV solver, which (unlike the default solver) doesn't do any work until
+        # check() is called
+        self.solver = SolverFor('QF_BV') if use_templates else Solver()
+
+        # Submissions are only turned into Z3 constraints once get_random() actually
+        # needs the solver, since building them is slow. If fast_path is set and
+        # there's a whole block of fully-known outputs, we don't need Z3 at all.
+        self.fast_path = fast_path
+        self.use_templates = use_templates
+        # The known bits of each submission and their values
+        self.masks = []
+        self.values = []
+        self.num_built = 0
+
+        # Instrumentation for the last call to get_random(); see get_stats()
+        self.num_variables = 624
+        self.stats = {}
+        self.build_time = 0
 
     #This particular method was adapted from https://www.schutzwerk.com/en/43/posts/attacking_a_random_number_generator/
     def symbolic_untamper(self, solver, y):
         name = next(SYMBOLIC_COUNTER)
+        self.num_variables += 4
 
         y1 = BitVec(f'y1_{name}', 32)
         y2 = BitVec(f'y2_{name}' , 32)
@@ -58,16 +199,34 @@ class Untwister:
 
         return MT
 
+    def instantiate_twist(self, MT, next_MT):
+        '''
+            Constrain next_MT to be the twist of MT, by copying the twist template.
+        '''
+        twist_template, (template_MT, template_next_MT), _, _ = get_templates()
+        return substitute(twist_template, *zip(template_MT, MT), *zip(template_next_MT, next_MT))
+
+    def instantiate_output(self, y, mask, value):
+        '''
+            Constrain the known bits (mask) of y, tempered, to be value - one equality per output,
+            with no symbolic guess or per-bit constraints.
+        '''
+        _, _, output_template, (template_y, template_mask, template_value) = get_templates()
+        return substitute(
+            output_template,
+            (template_y, y),
+            (template_mask, BitVecVal(mask, 32)),
+            (template_value, BitVecVal(value, 32))
+        )
+
     def get_symbolic(self, guess):
         name = next(SYMBOLIC_COUNTER)
-        ERROR = 'Must pass a string like "?1100???1001000??0?100?10??10010" where ? represents an unknown bit'
 
-        assert type(guess) == str, ERROR
-        assert all(map(lambda x: x in '01?', guess)), ERROR
-        assert len(guess) <= 32, "One 32-bit number at a time please"
+        check_guess(guess)
         guess = guess.zfill(32)
 
         self.symbolic_guess = BitVec(f'symbolic_guess_{name}', 32)
+        self.num_variables += 1
         guess = guess[::-1]
 
         for i, bit in enumerate(guess):
@@ -82,32 +241,260 @@ class Untwister:
             You need 624 numbers to completely clone the state.
                 You can input less than that though and this will give you the best guess for the state
         '''
+        mask, value = parse_guess(guess)
+        self.masks.append(mask)
+        self.values.append(value)
+
+    def submit_many(self, words, mask=None):
+        '''
+            Submit a whole array of outputs at once, like a '<u4' view of a keystream, instead of
+            one string per output. mask gives the known bits: either one mask for every word, or an
+            array with a mask per word. By default every bit is known.
+
+            Each word still becomes one masked equality, the same as submit(), just without the
+            round trip through strings.
+        '''
+        masks, values = parse_words(words, mask)
+        self.masks.extend(masks.tolist())
+        self.values.extend(values.tolist())
+
+    def build_constraints(self):
+        '''
+            Turn every submission that hasn't been added to the solver yet into constraints.
+        '''
+        for i in range(self.num_built, len(self.masks)):
+            self.submit_symbolic(self.masks[i], self.values[i])
+
+    def get_known_bits(self):
+        '''
+            Count the known bits of the submissions that have been added to the solver.
+        '''
+        return sum(bin(mask).count('1') for mask in self.masks[:self.num_built])
+
+    def submit_symbolic(self, mask, value):
+        start = time()
         if self.index >= 624:
             name = next(SYMBOLIC_COUNTER)
-            next_mt = self.symbolic_twist(self.MT)
-            self.MT = [BitVec(f'MT_{i}_{name}', 32) for i in range(624)]
-            for i in range(624):
-                self.solver.add(self.MT[i] == next_mt[i])
+            if self.use_templates:
+                next_MT = [BitVec(f'MT_{i}_{name}', 32) for i in range(624)]
+                self.solver.add(self.instantiate_twist(self.MT, next_MT))
+                self.MT = next_MT
+            else:
+                next_mt = self.symbolic_twist(self.MT)
+                self.MT = [BitVec(f'MT_{i}_{name}', 32) for i in range(624)]
+                for i in range(624):
+                    self.solver.add(self.MT[i] == next_mt[i])
+            self.num_variables += 624
             self.index = 0
 
-        symbolic_guess = self.get_symbolic(guess)
-        symbolic_guess = self.symbolic_untamper(self.solver, symbolic_guess)
-        self.solver.add(self.MT[self.index] == symbolic_guess)
+        if self.use_templates:
+            if mask:
+                self.solver.add(self.instantiate_output(self.MT[self.index], mask, value))
+        else:
+            symbolic_guess = self.get_symbolic(format_guess(mask, value))
+            symbolic_guess = self.symbolic_untamper(self.solver, symbolic_guess)
+            self.solver.add(self.MT[self.index] == symbolic_guess)
         self.index += 1
+        self.num_built += 1
+        self.build_time += time() - start
+
+    def check(self):
+        '''
+            Run the solver once, keeping track of how long it took.
+        '''
+        start = time()
+        result = self.solver.check()
+        self.stats['solve_seconds'] += time() - start
+        self.stats['checks'] += 1
+        return result
+
+    def is_unique(self, model):
+        '''
+            Check whether model is the only possible state, by adding a blocking clause that rules
+            it out and making sure the solver can't find anything else.
+        '''
+        self.solver.push()
+        self.solver.add(Or([x != model.eval(x, model_completion=True) for x in self.MT]))
+        unique = self.check() == unsat
+        self.solver.pop()
+        return unique
+
+    def solve_incremental(self, check_every):
+        '''
+            Add the remaining submissions to the solver a few at a time, checking along the way
+            whether the state is already pinned down. Once it is, the rest of the submissions are
+            checked against the clone instead of going through Z3.
 
-    def get_random(self):
+            Returns a random.Random() instance with the cloned state, or None if the state never
+            became unique early.
+        '''
+        known_bits = self.get_known_bits()
+        since_check = 0
+        while self.num_built < len(self.masks):
+            mask = self.masks[self.num_built]
+            self.submit_symbolic(mask, self.values[self.num_built])
+            known_bits += bin(mask).count('1')
+            since_check += 1
+
+            if known_bits < STATE_BITS or since_check < check_every or self.num_built == len(self.masks):
+                continue
+            since_check = 0
+
+            if self.check() != sat:
+                return None
+
+            model = self.solver.model()
+            if not self.is_unique(model):
+                continue
+
+            state = [model.eval(x, model_completion=True).as_long() for x in self.MT]
+            r = Random()
+            r.setstate((3, tuple(state+[self.index]), None))
+            if matches_guesses(r, self.masks[self.num_built:], self.values[self.num_built:]):
+                self.stats['early_stop'] = True
+                self.stats['skipped_submissions'] = len(self.masks) - self.num_built
+                return r
+
+            logger.debug('Unique model disagrees with the remaining submissions')
+            return None
+
+        return None
+
+    def get_stats(self):
+        '''
+            Get instrumentation for the last call to get_random(): the method used, the number of
+            submissions, constraints and symbolic variables, how long was spent building
+            constraints versus solving, and Z3's own statistics for the last check (in portfolio
+            mode, the winning worker's).
+        '''
+        return dict(self.stats)
+
+    def record_stats(self, method):
+        self.stats['method'] = method
+        self.stats['submissions'] = len(self.masks)
+        self.stats['constraints'] = len(self.solver.assertions())
+        self.stats['variables'] = self.num_variables
+        self.stats['build_seconds'] = self.build_time
+
+        # In portfolio mode, check_portfolio() already recorded the winner's statistics; this
+        # process's solver never ran check()
+        if method == 'z3' and 'portfolio' not in self.stats:
+            self.stats['z3'] = get_statistics(self.solver)
+
+        logger.debug('Stats: ' + ', '.join(f'{key}={value}' for key, value in self.stats.items() if key != 'z3'))
+
+    def get_random_untempered(self):
+        '''
+            If 624 consecutive outputs starting at the beginning of a block are fully known, the
+            state is just those outputs untempered - no solver needed.
+
+            Returns a random.Random() instance with the cloned state, or None if there's no such
+            block (or the other submissions don't match it).
+        '''
+        masks = np.array(self.masks, dtype=np.uint32)
+        values = np.array(self.values, dtype=np.uint32)
+        known = masks == 0xFFFFFFFF
+
+        for start in range(0, len(masks) - 623, 624):
+            if known[start:start + 624].all():
+                break
+        else:
+            return None
+
+        block = values[start:start + 624].copy()
+        untemper(block)
+
+        # Make sure everything from this block onwards agrees with the recovered state
+        # (anything before it can't be checked without going backwards)
+        mt = MT19937((3, tuple(int(x) for x in block) + (0,), None))
+        if np.any((mt.random_words(len(masks) - start) & masks[start:]) != values[start:]):
+            logger.debug('Fully-known outputs disagree with the other submissions')
+            return None
+
+        # Twist forward to the block of the last submission
+        for _ in range((len(masks) - 1) // 624 - start // 624):
+            twist(block)
+
+        index = (len(masks) - 1) % 624 + 1
+        r = Random()
+        r.setstate((3, tuple(int(x) for x in block) + (index,), None))
+        return r
+
+    def check_portfolio(self, portfolio):
+        '''
+            Race copies of the solver under different configurations (see PORTFOLIO_CONFIGS) in
+            separate processes, take the first model that comes back, and kill the rest.
+
+            Returns the values of the current block's state words.
+        '''
+        start = time()
+        constraints = self.solver.sexpr()
+        names = [str(x) for x in self.MT]
+        jobs = [(constraints, names, config) for config in get_portfolio_configs(portfolio)]
+
+        # spawn rather than fork, so that the workers don't inherit this process's Z3 context
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(portfolio) as pool:
+            # Leaving the with block terminates any workers that are still solving
+            for config, state, seconds, statistics in pool.imap_unordered(solve_portfolio_config, jobs):
+                if state is not None:
+                    break
+            else:
+                raise RuntimeError('No solver in the portfolio found a model')
+
+        self.stats['solve_seconds'] += time() - start
+        self.stats['checks'] += 1
+        self.stats['portfolio'] = {'workers': portfolio, 'winner': config, 'winner_seconds': seconds}
+        self.stats['z3'] = statistics
+        return state
+
+    def get_random(self, incremental=False, check_every=624, portfolio=DEFAULT_PORTFOLIO):
         '''
             This will give you a random.Random() instance with the cloned state.
+
+            If incremental is set, the solver is run every check_every submissions once there are
+            enough known bits to pin down the state, and stops as soon as the state is unique.
+            If portfolio is more than 1, the final solve races that many solver configurations in
+            separate processes (see check_portfolio()); by default it doesn't, but
+            get_random(portfolio=get_cpu_portfolio()) uses every CPU. See get_stats() for how the
+            time was spent.
         '''
+        self.stats = {'solve_seconds': 0, 'checks': 0, 'early_stop': False}
+        # Only count the constraints built during this call; anything built by an earlier one is
+        # already in the solver
+        self.build_time = 0
+
+        if self.fast_path:
+            start = time()
+            r = self.get_random_untempered()
+            if r is not None:
+                self.stats['solve_seconds'] = time() - start
+                self.record_stats('untemper')
+                logger.debug(f'Solved by untempering! (in {round(time()-start,3)}s)')
+                return r
+
         logger.debug('Solving...')
         start = time()
-        self.solver.check()
-        model = self.solver.model()
+        if incremental:
+            r = self.solve_incremental(check_every)
+            if r is not None:
+                self.record_stats('z3')
+                logger.debug(f'Solved early! (in {round(time()-start,3)}s)')
+                return r
+
+        self.build_constraints()
+        if portfolio > 1:
+            state = self.check_portfolio(portfolio)
+        else:
+            self.check()
+            model = self.solver.model()
+
+            #Compute best guess for state
+            state = list(map(lambda x: model.eval(x, model_completion=True).as_long(), self.MT))
         end = time()
+        self.record_stats('z3')
         logger.debug(f'Solved! (in {round(end-start,3)}s)')
 
-        #Compute best guess for state
-        state = list(map(lambda x: model[x].as_long(), self.MT))
         result_state = (3, tuple(state+[self.index]), None)
         r = Random()
         r.setstate(result_state)
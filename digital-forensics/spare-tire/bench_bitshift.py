@@ -0,0 +1,181 @@
+"""
+Benchmark `bitshift.shift_bits` (whole file in memory) and `bitshift.shift_file`
+(streaming) against the original `bitstring` code, on tire.jpg and on a large
+synthetic file.
+
+Each run happens in a fresh process, so that the peak memory of one doesn't
+hide the next. The outputs of every implementation are checked against each
+other.
+
+    python bench_bitshift.py
+    python bench_bitshift.py --synthetic-size 100000000 --bits 1 -3 --json results.json
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from bitshift import shift_bits, shift_file
+
+DEFAULT_SYNTHETIC_SIZE = 2**30
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux, but bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def shift_with_bitstring(input_file: Path, output_file: Path, bits: int) -> None:
+    """
+    What create_flag.py and solve.py used to do.
+    """
+    import bitstring
+
+    with open(input_file, "rb") as fp:
+        stream = bitstring.BitArray(fp.read())
+
+    if bits > 0:
+        stream.prepend("0b" + "0" * bits)
+    elif bits < 0:
+        stream = stream[-bits:]
+
+    with open(output_file, "wb") as fp:
+        stream.tofile(fp)
+
+
+def shift_with_numpy(input_file: Path, output_file: Path, bits: int) -> None:
+    data = bytearray(input_file.stat().st_size)
+    with open(input_file, "rb") as fp:
+        fp.readinto(data)
+
+    # Dropping bits can happen in place
+    shifted = shift_bits(data, bits, out=data if bits < 0 else None)
+
+    with open(output_file, "wb") as fp:
+        fp.write(shifted)
+
+
+IMPLEMENTATIONS: Dict[str, Callable[[Path, Path, int], None]] = {
+    "bitstring": shift_with_bitstring,
+    "numpy": shift_with_numpy,
+    "stream": shift_file,
+}
+
+
+def has_bitstring() -> bool:
+    try:
+        import bitstring
+    except ImportError:
+        return False
+    return hasattr(bitstring, "BitArray")
+
+
+def _md5_file(path: Path) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as fp:
+        while block := fp.read(2**22):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def run_one(name: str, input_file: Path, output_file: Path, bits: int) -> Dict:
+    rss_before = _max_rss_mb()
+    start = perf_counter()
+    IMPLEMENTATIONS[name](input_file, output_file, bits)
+    seconds = perf_counter() - start
+
+    size = input_file.stat().st_size
+    return {
+        "implementation": name,
+        "input": str(input_file),
+        "input_bytes": size,
+        "bits": bits,
+        "seconds": seconds,
+        "mb_per_second": size / 2**20 / seconds if seconds else None,
+        "peak_rss_mb": _max_rss_mb(),
+        "peak_rss_growth_mb": _max_rss_mb() - rss_before,
+        "md5": _md5_file(output_file),
+    }
+
+
+def _run_one(args) -> Dict:
+    return run_one(*args)
+
+
+def make_synthetic_file(path: Path, size: int, seed: int = 0) -> None:
+    """
+    Write `size` random bytes to `path`, a block at a time.
+    """
+    rng = np.random.default_rng(seed)
+    with open(path, "wb") as fp:
+        for start in range(0, size, 2**24):
+            fp.write(rng.integers(0, 256, min(2**24, size - start), dtype=np.uint8).tobytes())
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--synthetic-size",
+        type=int,
+        default=DEFAULT_SYNTHETIC_SIZE,
+        help="Size in bytes of the synthetic file; 0 to skip it (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--bits",
+        type=int,
+        nargs="+",
+        default=[1, -1],
+        help="Shifts to run; positive prepends zero bits, negative drops bits (default: %(default)s)",
+    )
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    names = list(IMPLEMENTATIONS)
+    if not has_bitstring():
+        print("bitstring isn't installed, so only the NumPy version will run")
+        names.remove("bitstring")
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp, ctx.Pool(1, maxtasksperchild=1) as pool:
+        inputs = [Path(__file__).with_name("tire.jpg")]
+        if args.synthetic_size:
+            inputs.append(Path(tmp) / "synthetic.bin")
+            make_synthetic_file(inputs[-1], args.synthetic_size)
+
+        for input_file in inputs:
+            for bits in args.bits:
+                hashes = set()
+                for name in names:
+                    output_file = Path(tmp) / "output.bin"
+                    result = pool.apply(_run_one, ((name, input_file, output_file, bits),))
+                    output_file.unlink()
+
+                    results.append(result)
+                    hashes.add(result["md5"])
+                    print(
+                        f"{input_file.name:<14} {bits:>+3} bits, {name:<10}: "
+                        f"{result['seconds']:8.3f}s, {result['mb_per_second']:8.1f} MB/s, "
+                        f"peak RSS {result['peak_rss_mb']:8.1f} MB"
+                    )
+
+                if len(hashes) != 1:
+                    raise RuntimeError(f"Outputs differ for {input_file.name}, {bits} bits")
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
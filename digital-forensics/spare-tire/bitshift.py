@@ -0,0 +1,209 @@
+"""
+Shift the bits of a byte buffer by any number of bits, with NumPy.
+
+This replaces the `bitstring` code the challenge was made with, and gives exactly
+the same bytes:
+
+- `shift_bits(data, n)` for n > 0 is `BitStream(data)`, with n zero bits
+  prepended
+- `shift_bits(data, -n)` is `BitStream(data)[n:]`
+
+followed by `BitStream.tofile()`, which pads the last byte with zero bits.
+
+Shifting by a whole number of bytes is just a copy; the rest is done a block at a
+time as `(a >> k) | (b << (8 - k))` over adjacent bytes, so it never needs more
+than a block's worth of scratch space on top of the input and output.
+
+`shift_file()` does the same thing to a file, streaming it through a single
+block-sized buffer, so it works on files of any size (disk images included) in
+constant memory.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# The number of bytes shifted at a time
+DEFAULT_BLOCK_SIZE = 4 * 2**20
+
+
+def get_shifted_size(size: int, bits: int) -> int:
+    """
+    Get the size in bytes of a `size`-byte buffer after shifting it by `bits`
+    (see `shift_bits`), including the padding in the last byte.
+    """
+    return max(0, (size * 8 + bits + 7) // 8)
+
+
+def _shift_block(
+    src: np.ndarray, shift: int, carry: int, out: np.ndarray, scratch: np.ndarray
+) -> int:
+    """
+    Shift a block of bytes right by `shift` (1-7) bits into `out`, which is the
+    same length as `src` and may be the same memory.
+
+    `carry` is shifted in at the start of the block; it's the byte made of the bits
+    that fell off the end of the previous block, which is returned for the next.
+    """
+    n = len(src)
+    spill = scratch[:n]
+    np.left_shift(src, 8 - shift, out=spill)
+    next_carry = int(spill[-1])
+
+    np.right_shift(src, shift, out=out)
+    out[1:] |= spill[:-1]
+    out[0] |= carry
+
+    return next_carry
+
+
+def shift_bits(
+    data,
+    bits: int,
+    out: Optional[np.ndarray] = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> np.ndarray:
+    """
+    Shift the bits of a bytes-like object.
+
+    :param data: The buffer to shift.
+    :param bits: If positive, the number of zero bits to add to the start. If
+        negative, the number of bits to drop from the start.
+    :param out: A writable buffer of at least `get_shifted_size()` bytes to write
+        the result to. When dropping bits, this can be `data` itself, to shift in
+        place. If None, a new array is allocated.
+    :param block_size: The number of bytes to shift at a time.
+    :returns: A uint8 array of the shifted bytes (a view of `out`, if given).
+    """
+    if block_size <= 0:
+        raise ValueError(f"Block size must be positive ({block_size})")
+
+    src = np.frombuffer(data, dtype=np.uint8)
+    size = get_shifted_size(len(src), bits)
+
+    if out is None:
+        out = np.empty(size, dtype=np.uint8)
+    else:
+        out = np.frombuffer(out, dtype=np.uint8)
+        if not out.flags.writeable:
+            raise TypeError("Output buffer must be writable")
+        if len(out) < size:
+            raise ValueError(f"Output buffer is too small ({len(out)} < {size} bytes)")
+        out = out[:size]
+
+    if size == 0:
+        return out
+
+    whole_bytes, partial_bits = divmod(abs(bits), 8)
+    if bits >= 0:
+        # Shifting right: whole bytes of zeros, then the rest moves over by the
+        # remaining bits with nothing carried into the first byte
+        out[:whole_bytes] = 0
+        body = src
+        dst = out[whole_bytes:]
+        shift = partial_bits
+        carry = 0
+    elif partial_bits:
+        # Dropping k bits from the start is the same as shifting everything after
+        # the first (remaining) byte right by 8 - k bits, where the first byte's
+        # last 8 - k bits are carried in
+        body = src[whole_bytes + 1 :]
+        dst = out
+        shift = 8 - partial_bits
+        carry = (int(src[whole_bytes]) << partial_bits) & 0xFF
+    else:
+        body = src[whole_bytes:]
+        dst = out
+        shift = 0
+
+    if shift == 0:
+        dst[: len(body)] = body
+        return out
+
+    scratch = np.empty(min(block_size, max(len(body), 1)), dtype=np.uint8)
+    for start in range(0, len(body), block_size):
+        end = min(start + block_size, len(body))
+        carry = _shift_block(body[start:end], shift, carry, dst[start:end], scratch)
+
+    # The bits that fell off the end, padded with zeros
+    dst[len(body)] = carry
+
+    return out
+
+
+def format_bits(data, count: int = 40) -> str:
+    """
+    Format the first `count` bits of a buffer as binary and hex, along the lines
+    of `BitStream.pp()`.
+    """
+    head = bytes(np.frombuffer(data, dtype=np.uint8)[: (count + 7) // 8])
+    binary = " ".join(f"{byte:08b}" for byte in head)
+    return f"{binary} : {head.hex(' ')}"
+
+
+def format_file_bits(path: Path, count: int = 40) -> str:
+    """
+    Like `format_bits`, but only reads the start of a file.
+    """
+    with open(path, "rb") as fp:
+        return format_bits(fp.read((count + 7) // 8), count)
+
+
+def shift_file(
+    input_file: Path,
+    output_file: Path,
+    bits: int,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> int:
+    """
+    Shift the bits of a file, like `shift_bits`, writing the result to
+    `output_file`.
+
+    The input is read `block_size` bytes at a time into one reusable buffer and
+    shifted in place, carrying the bits that fall off the end of each block into
+    the start of the next. The last byte is padded with zeros the same way as
+    `BitStream.tofile()`.
+
+    :returns: The size of the output file.
+    """
+    if block_size <= 0:
+        raise ValueError(f"Block size must be positive ({block_size})")
+
+    whole_bytes, partial_bits = divmod(abs(bits), 8)
+
+    with open(input_file, "rb") as in_fp, open(output_file, "wb") as out_fp:
+        out_size = get_shifted_size(os.fstat(in_fp.fileno()).st_size, bits)
+        if out_size == 0:
+            return 0
+
+        block = np.zeros(block_size, dtype=np.uint8)
+        scratch = np.empty_like(block)
+
+        carry = 0
+        if bits >= 0:
+            # The block is still all zeros, so use it to write the leading zero bytes
+            for start in range(0, whole_bytes, block_size):
+                out_fp.write(block[: min(block_size, whole_bytes - start)])
+            shift = partial_bits
+        else:
+            # See shift_bits() - everything after the first remaining byte is
+            # shifted right, with the end of that byte carried in
+            in_fp.seek(whole_bytes)
+            if partial_bits:
+                carry = (in_fp.read(1)[0] << partial_bits) & 0xFF
+                shift = 8 - partial_bits
+            else:
+                shift = 0
+
+        while count := in_fp.readinto(block):
+            chunk = block[:count]
+            if shift:
+                carry = _shift_block(chunk, shift, carry, chunk, scratch)
+            out_fp.write(chunk)
+
+        if shift:
+            out_fp.write(bytes([carry]))
+
+    return out_size
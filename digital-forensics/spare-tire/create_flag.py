@@ -1,9 +1,7 @@
 import argparse
 from pathlib import Path
 
-import bitstring
-
-bits = bitstring.BitStream()
+from bitshift import DEFAULT_BLOCK_SIZE, format_file_bits, shift_file
 
 def get_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Creates .tire files.")
@@ -15,28 +13,30 @@ def get_args() -> argparse.Namespace:
         help="The file to convert into a .tire file."
     )
 
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=DEFAULT_BLOCK_SIZE,
+        help="The number of bytes to read and shift at a time (default: %(default)s)."
+    )
+
     return parser.parse_args()
 
 def main(args: argparse.Namespace) -> None:
     input_file: Path = args.input_file
+    output_file = input_file.with_suffix(input_file.suffix + ".tire")
 
-    with open(input_file, "rb") as fp:
-        bits = bitstring.BitStream(fp.read())
-    
     print("Before adding zero:")
-    bits[:40].pp(width=80)
-    
-    bits.prepend('0b0')
+    print(format_file_bits(input_file))
+
+    # Shift everything right by one bit, i.e. prepend a single zero bit. The file is
+    # streamed through a fixed-size buffer, so this works on files of any size. The
+    # last byte is padded with zeros, as necessary (just like bitstring's tofile()
+    # does).
+    shift_file(input_file, output_file, 1, block_size=args.block_size)
 
     print("After adding zero:")
-    bits[:40].pp(width=80)
-
-    with open(input_file.with_suffix(input_file.suffix + ".tire"), "wb") as fp:
-        # bits.tobytes() converts it to the built-in `bytes` type. It also automatically
-        # adds leading zeros, as necessary.
-        #
-        # bits.tofile() does this, too, against an existing file pointer.
-        bits.tofile(fp)
+    print(format_file_bits(output_file))
 
 if __name__ == "__main__":
     # Parse arguments
@@ -0,0 +1,229 @@
+"""
+Work out how many bits a file was shifted by (and what it was before), by looking
+for known magic numbers at every bit alignment of its first few KB.
+
+Every signature is shifted by every candidate amount ahead of time, into a table
+of (pattern, mask) pairs: the mask covers just the bits that came from the
+signature, since whatever was prepended and whatever follows the signature could
+be anything. Checking a batch of files is then a single NumPy comparison of their
+headers against the whole table.
+
+    for path, detection in triage(Path("blobs").iterdir()):
+        print(path, detection)
+"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from bitshift import shift_bits
+
+# The number of bytes from the start of each file that are searched
+HEADER_SIZE = 4096
+
+# By default, look for files that were shifted by up to 7 bits; past that, the
+# alignment repeats and only the number of whole bytes in front changes
+DEFAULT_MAX_SHIFT = 7
+
+# The number of files compared against the table at once
+DEFAULT_BATCH_SIZE = 1024
+
+# (format, offset, signature) for each known magic number. Longer signatures win
+# when more than one matches, so short ones (like "MZ") only count if nothing
+# better does.
+MAGIC_NUMBERS: List[Tuple[str, int, bytes]] = [
+    ("jpeg", 0, b"\xff\xd8\xff"),
+    ("png", 0, b"\x89PNG\r\n\x1a\n"),
+    ("gif", 0, b"GIF87a"),
+    ("gif", 0, b"GIF89a"),
+    ("bmp", 0, b"BM"),
+    ("tiff", 0, b"II*\x00"),
+    ("tiff", 0, b"MM\x00*"),
+    ("pdf", 0, b"%PDF-"),
+    ("zip", 0, b"PK\x03\x04"),
+    ("gzip", 0, b"\x1f\x8b\x08"),
+    ("bzip2", 0, b"BZh"),
+    ("xz", 0, b"\xfd7zXZ\x00"),
+    ("7z", 0, b"7z\xbc\xaf\x27\x1c"),
+    ("rar", 0, b"Rar!\x1a\x07"),
+    ("elf", 0, b"\x7fELF"),
+    ("pe", 0, b"MZ"),
+    ("java-class", 0, b"\xca\xfe\xba\xbe"),
+    ("sqlite", 0, b"SQLite format 3\x00"),
+    ("ogg", 0, b"OggS"),
+    ("flac", 0, b"fLaC"),
+    ("mp3", 0, b"ID3"),
+    ("riff", 0, b"RIFF"),
+    ("mp4", 4, b"ftyp"),
+    ("xml", 0, b"<?xml"),
+    ("mbr", 510, b"\x55\xaa"),
+    ("gpt", 512, b"EFI PART"),
+    ("ntfs", 3, b"NTFS    "),
+    ("fat32", 82, b"FAT32   "),
+    ("ext", 1080, b"\x53\xef"),
+]
+
+
+class Detection(NamedTuple):
+    # The format whose magic number matched
+    format: str
+    # The number of bits that were prepended to the file
+    shift: int
+    # The number of bits of the magic number that matched
+    known_bits: int
+
+
+class SignatureTable(NamedTuple):
+    """
+    Every signature at every shift, padded to the same length so that they can
+    all be compared at once.
+    """
+
+    # Which entry of MAGIC_NUMBERS each row came from
+    signatures: np.ndarray
+    shifts: np.ndarray
+    # For each row, the indices into a file's header to compare against, and
+    # where the pattern ends
+    indices: np.ndarray
+    ends: np.ndarray
+    patterns: np.ndarray
+    masks: np.ndarray
+    known_bits: np.ndarray
+
+    @classmethod
+    def build(cls, max_shift: int, header_size: int) -> "SignatureTable":
+        rows = []
+        for i, (_, offset, signature) in enumerate(MAGIC_NUMBERS):
+            ones = b"\xff" * len(signature)
+            for shift in range(max_shift + 1):
+                whole_bytes, partial_bits = divmod(shift, 8)
+
+                # Shifting by the whole bytes just moves the signature along
+                pattern = shift_bits(signature, partial_bits)
+                mask = shift_bits(ones, partial_bits)
+                start = offset + whole_bytes
+
+                # Skip anything that doesn't fit in the part of the file we read
+                if start + len(pattern) <= header_size:
+                    rows.append((i, shift, start, pattern, mask))
+
+        width = max(len(pattern) for *_, pattern, _ in rows)
+        patterns = np.zeros((len(rows), width), dtype=np.uint8)
+        masks = np.zeros_like(patterns)
+        starts = np.empty(len(rows), dtype=np.intp)
+        ends = np.empty_like(starts)
+        for row, (_, _, start, pattern, mask) in enumerate(rows):
+            patterns[row, : len(pattern)] = pattern
+            masks[row, : len(mask)] = mask
+            starts[row] = start
+            ends[row] = start + len(pattern)
+
+        # Padding has a mask of 0, so where it points doesn't matter as long as
+        # it's in bounds
+        indices = np.minimum(starts[:, None] + np.arange(width), header_size - 1)
+
+        return cls(
+            signatures=np.array([row[0] for row in rows], dtype=np.intp),
+            shifts=np.array([row[1] for row in rows], dtype=np.intp),
+            indices=indices,
+            ends=ends,
+            patterns=patterns,
+            masks=masks,
+            known_bits=np.unpackbits(masks, axis=1).sum(axis=1),
+        )
+
+
+@lru_cache(maxsize=None)
+def get_signature_table(
+    max_shift: int = DEFAULT_MAX_SHIFT, header_size: int = HEADER_SIZE
+) -> SignatureTable:
+    """
+    Get the table of shifted signatures, built once for each set of parameters.
+    """
+    return SignatureTable.build(max_shift, header_size)
+
+
+def read_headers(
+    paths: List[Path], header_size: int = HEADER_SIZE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read the first `header_size` bytes of each file into one array (padded with
+    zeros), along with how many bytes were actually read from each.
+    """
+    headers = np.zeros((len(paths), header_size), dtype=np.uint8)
+    lengths = np.empty(len(paths), dtype=np.intp)
+    for i, path in enumerate(paths):
+        with open(path, "rb") as fp:
+            lengths[i] = fp.readinto(headers[i])
+
+    return headers, lengths
+
+
+def detect_shifts(
+    headers: np.ndarray, lengths: np.ndarray, table: SignatureTable
+) -> List[Optional[Detection]]:
+    """
+    Find the best matching (signature, shift) for each header, or None if nothing
+    matched. The best match is the one with the most known bits, then the
+    smallest shift.
+    """
+    windows = headers[:, table.indices]
+    matches = ((windows & table.masks) == table.patterns).all(axis=2)
+
+    # A signature can't match past the end of a short file, even if the zero
+    # padding happens to fit
+    matches &= table.ends[None, :] <= lengths[:, None]
+
+    max_shift = int(table.shifts.max())
+    scores = np.where(
+        matches, table.known_bits * (max_shift + 1) + (max_shift - table.shifts), -1
+    )
+    best = scores.argmax(axis=1)
+
+    detections: List[Optional[Detection]] = []
+    for i, row in enumerate(best):
+        if scores[i, row] < 0:
+            detections.append(None)
+            continue
+
+        name, _, _ = MAGIC_NUMBERS[table.signatures[row]]
+        detections.append(
+            Detection(name, int(table.shifts[row]), int(table.known_bits[row]))
+        )
+
+    return detections
+
+
+def triage(
+    paths: Iterable[Path],
+    max_shift: int = DEFAULT_MAX_SHIFT,
+    header_size: int = HEADER_SIZE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[Tuple[Path, Optional[Detection]]]:
+    """
+    Detect the shift of many files, reading and checking their headers
+    `batch_size` files at a time.
+    """
+    table = get_signature_table(max_shift, header_size)
+
+    batch: List[Path] = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) == batch_size:
+            yield from zip(batch, detect_shifts(*read_headers(batch, header_size), table))
+            batch = []
+
+    if batch:
+        yield from zip(batch, detect_shifts(*read_headers(batch, header_size), table))
+
+
+def detect_file(
+    path: Path, max_shift: int = DEFAULT_MAX_SHIFT, header_size: int = HEADER_SIZE
+) -> Optional[Detection]:
+    """
+    Detect the shift of a single file.
+    """
+    ((_, detection),) = triage([path], max_shift, header_size)
+    return detection
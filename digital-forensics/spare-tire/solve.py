@@ -1,9 +1,8 @@
 import argparse
 from pathlib import Path
 
-import bitstring
-
-bits = bitstring.BitStream()
+from bitshift import DEFAULT_BLOCK_SIZE, format_file_bits, shift_file
+from detect import DEFAULT_MAX_SHIFT, detect_file, triage
 
 def get_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Creates and verifies .lol files.")
@@ -12,29 +11,88 @@ def get_args() -> argparse.Namespace:
     parser.add_argument(
         "input_file",
         type=Path,
-        help="The file to convert back."
+        help="The file to convert back, or a directory of files to triage."
+    )
+
+    parser.add_argument(
+        "--detect",
+        action="store_true",
+        help="Work out how many bits the file was shifted by from its magic number, "
+        "instead of assuming a single leading zero. Always on for directories."
+    )
+
+    parser.add_argument(
+        "--max-shift",
+        type=int,
+        default=DEFAULT_MAX_SHIFT,
+        help="The largest shift (in bits) to look for when detecting (default: %(default)s)."
+    )
+
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help="Where to write the files from a directory (default: the directory's "
+        "name with _solved on the end)."
+    )
+
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=DEFAULT_BLOCK_SIZE,
+        help="The number of bytes to read and shift at a time (default: %(default)s)."
     )
 
     return parser.parse_args()
 
-def main(args: argparse.Namespace) -> None:
-    input_file: Path = args.input_file
+def get_output_path(input_file: Path) -> Path:
+    return input_file.with_suffix("").with_stem(input_file.stem + "_solved")
 
-    with open(input_file, "rb") as fp:
-        bits = bitstring.BitStream(fp.read())
-    
+def unshift(input_file: Path, output_file: Path, shift: int, block_size: int) -> None:
     print("Before dropping zero:")
-    bits[:40].pp(width=80)
-    
-    bits = bits[1:]
+    print(format_file_bits(input_file))
+
+    # Shift everything left, dropping the leading zero(s). Like creating the file,
+    # this streams it through a fixed-size buffer, and pads the last byte with
+    # zeros.
+    shift_file(input_file, output_file, -shift, block_size=block_size)
 
     print("After dropping zero:")
-    bits[:40].pp(width=80)
+    print(format_file_bits(output_file))
+
+def triage_directory(directory: Path, args: argparse.Namespace) -> None:
+    output_dir: Path = args.output_dir or directory.with_name(directory.name + "_solved")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # The headers of every file are checked against every shifted magic number in
+    # one go, then only the ones that were actually shifted get unshifted
+    paths = sorted(path for path in directory.iterdir() if path.is_file())
+    for path, detection in triage(paths, args.max_shift):
+        if detection is None:
+            print(f"{path.name}: no known file signature")
+        elif detection.shift == 0:
+            print(f"{path.name}: {detection.format}, not shifted")
+        else:
+            print(f"{path.name}: {detection.format}, shifted by {detection.shift} bit(s)")
+            shift_file(path, output_dir / path.name, -detection.shift, block_size=args.block_size)
+
+def main(args: argparse.Namespace) -> None:
+    input_file: Path = args.input_file
+
+    if input_file.is_dir():
+        triage_directory(input_file, args)
+        return
+
+    shift = 1
+    if args.detect:
+        detection = detect_file(input_file, args.max_shift)
+        if detection is None:
+            print("Couldn't find a known file signature at any alignment.")
+            exit(1)
+
+        print(f"Looks like a {detection.format} file, shifted by {detection.shift} bit(s).")
+        shift = detection.shift
 
-    with open(input_file.with_suffix("").with_stem(input_file.stem + "_solved"), "wb") as fp:
-        # .tobytes() converts it to the built-in `bytes` type. It also automatically
-        # adds leading zeros, as necessary.
-        bits.tofile(fp)
+    unshift(input_file, get_output_path(input_file), shift, args.block_size)
 
 if __name__ == "__main__":
     # Parse arguments
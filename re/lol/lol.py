@@ -23,11 +23,24 @@ but where's the fun in that?
 """
 
 import argparse
+import bisect
+import concurrent.futures
+import contextlib
+import csv
 import hashlib
+import io
+import json
 import logging
+import mmap
+import os
 import random
+import re
+import secrets
+import sys
+import time
+from array import array
 from pathlib import Path
-from typing import Optional, List
+from typing import Iterable, Iterator, Optional, List, Tuple
 
 DEFAULT_INPUT_FILE = "flag.png"
 
@@ -35,6 +48,10 @@ DEFAULT_INPUT_FILE = "flag.png"
 DEFAULT_MIN_RANDOM_CHUNK_SIZE = 1024
 DEFAULT_MAX_RANDOM_CHUNK_SIZE = DEFAULT_MIN_RANDOM_CHUNK_SIZE * 10
 
+# Team IDs become directory names in batch mode, so they can't contain path
+# separators or be "." or ".."
+TEAM_ID_PATTERN = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*")
+
 
 FORMAT = "[%(levelname)s] %(filename)s:%(lineno)s - %(funcName)s(): %(message)s"
 logging.basicConfig(format=FORMAT)
@@ -53,6 +70,11 @@ class Chunk:
     # Constants, in bytes
     SIZE_CHUNK_LENGTH = 4
     SIZE_CHUNK_OFFSET = 8
+    SIZE_CHUNK_OVERHEAD = SIZE_CHUNK_LENGTH + SIZE_CHUNK_OFFSET
+
+    MAX_CHUNK_LENGTH = (2 ** (8 * SIZE_CHUNK_LENGTH)) - 1
+
+    __slots__ = ("data", "idx", "next", "is_final_chunk")
 
     def __init__(self, data: bytes, idx: int):
         """
@@ -74,17 +96,32 @@ class Chunk:
             )
 
     @classmethod
-    def get_next_chunk_data(cls, data: bytes, cur_offset: int) -> "bytes, int":
+    def get_next_chunk_data(
+        cls, data: memoryview, cur_offset: int
+    ) -> "memoryview, int":
         """
         Return a tuple containing the data of the chunk starting at `cur_offset`
         and the offset of the next chunk.
+
+        The data is returned as a slice of `data`, so passing in a memoryview
+        avoids copying the chunk. If the chunk runs past the end of `data`, this
+        raises RuntimeError.
         """
         start_offset = cur_offset
         data_offset = start_offset + cls.SIZE_CHUNK_LENGTH
 
+        if data_offset > len(data):
+            raise RuntimeError(f"Chunk at offset {cur_offset} has a truncated length")
+
         chunk_length = int.from_bytes(data[cur_offset:data_offset], "big")
         next_offset = data_offset + chunk_length
 
+        if next_offset + cls.SIZE_CHUNK_OFFSET > len(data):
+            raise RuntimeError(
+                f"Chunk at offset {cur_offset} with length {chunk_length} runs past"
+                f" the end of the file"
+            )
+
         chunk_data = data[data_offset:next_offset]
         next_pointer = int.from_bytes(
             data[next_offset : next_offset + cls.SIZE_CHUNK_OFFSET], "big"
@@ -98,7 +135,7 @@ class Chunk:
 
         Return True if it is within the allowed range, False otherwise.
         """
-        return len(self.data) <= (2 ** (8 * self.SIZE_CHUNK_LENGTH)) - 1
+        return len(self.data) <= self.MAX_CHUNK_LENGTH
 
     def as_bytes(self) -> bytes:
         """
@@ -123,6 +160,120 @@ class Chunk:
         return len(self.data) + self.SIZE_CHUNK_LENGTH + self.SIZE_CHUNK_OFFSET
 
 
+class ChunkTable:
+    """
+    The layout of every chunk in a .lol file, stored as parallel arrays rather
+    than as one object per chunk.
+
+    Chunks are stored in the order of the reconstructed file. For each chunk, this
+    records:
+    - the length of its data
+    - the offset of its data in the reconstructed file ("logical" offset)
+    - the absolute offset of the chunk in the .lol file ("physical" offset)
+
+    The shuffled order of the chunks is implied by the physical offsets, and the
+    `next` pointer of each chunk is just the physical offset of the chunk after it.
+    The data itself isn't stored; it's wherever the logical offsets point to in
+    the source file.
+    """
+
+    __slots__ = ("sizes", "logical_offsets", "physical_offsets")
+
+    def __init__(
+        self,
+        sizes: Optional[array] = None,
+        logical_offsets: Optional[array] = None,
+        physical_offsets: Optional[array] = None,
+    ):
+        """
+        Create a chunk table from its (already populated) arrays, or an empty one.
+
+        :param sizes: The length of each chunk's data.
+        :param logical_offsets: The offset of each chunk in the reconstructed file.
+        :param physical_offsets: The offset of each chunk in the .lol file.
+        """
+        self.sizes: array = array("Q") if sizes is None else sizes
+        self.logical_offsets: array = (
+            array("Q") if logical_offsets is None else logical_offsets
+        )
+        self.physical_offsets: array = (
+            array("Q") if physical_offsets is None else physical_offsets
+        )
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    @classmethod
+    def from_sizes(cls, sizes: Iterable[int], seed=None) -> "ChunkTable":
+        """
+        Lay out chunks of the given sizes in a random order.
+
+        The order is the same as the one `LOLFile.from_chunks` has always used;
+        `sample` only depends on the length of the population, so sampling
+        indexes gives the same order as sampling the chunks themselves.
+
+        :param sizes: The length of each chunk's data, in sequential order.
+        :param seed: A valid seed for `random.Random`.
+        """
+        table = cls(array("Q", sizes))
+        if any(size > Chunk.MAX_CHUNK_LENGTH for size in table.sizes):
+            raise RuntimeError(
+                "Chunk length exceeds UINT32_MAX, the maximum size of a chunk"
+            )
+
+        logical_offset = 0
+        for size in table.sizes:
+            table.logical_offsets.append(logical_offset)
+            logical_offset += size
+
+        # The same seed will always lead to the same random outputs. Always keep
+        # the first "true" chunk first.
+        randomizer = random.Random(seed)
+        random_order = array("Q", [0])
+        random_order.extend(randomizer.sample(range(1, len(table)), len(table) - 1))
+
+        # Calculate the offset of each ordered chunk into the resulting file.
+        table.physical_offsets = array("Q", bytes(8 * len(table)))
+        cur_offset = LOLFile.SIZE_FILE_LENGTH + LOLFile.SIZE_MD5_LENGTH
+        for idx in random_order:
+            table.physical_offsets[idx] = cur_offset
+            cur_offset += table.sizes[idx] + Chunk.SIZE_CHUNK_OVERHEAD
+
+        return table
+
+    def append(self, size: int, logical_offset: int, physical_offset: int) -> None:
+        """
+        Add a chunk to the end of the table.
+        """
+        self.sizes.append(size)
+        self.logical_offsets.append(logical_offset)
+        self.physical_offsets.append(physical_offset)
+
+    def get_next_offset(self, idx: int) -> int:
+        """
+        Get the value of the `next` pointer of chunk `idx`, which is 0 for the
+        final chunk.
+        """
+        return self.physical_offsets[idx + 1] if idx + 1 < len(self) else 0
+
+    def get_data_offset(self, idx: int) -> int:
+        """
+        Get the absolute offset of the data of chunk `idx` in the .lol file.
+        """
+        return self.physical_offsets[idx] + Chunk.SIZE_CHUNK_LENGTH
+
+    def get_lol_size(self) -> int:
+        """
+        Get the size of the .lol file described by this table.
+        """
+        return (
+            LOLFile.SIZE_FILE_LENGTH
+            + LOLFile.SIZE_MD5_LENGTH
+            + sum(self.sizes)
+            + len(self) * Chunk.SIZE_CHUNK_OVERHEAD
+        )
+
+
 class LOLFile:
     """
     Format:
@@ -167,7 +318,7 @@ class LOLFile:
 
         # Read in a random amount of the file. So long as we get bytes back,
         # continue attempting to read.
-        with open(args.input_file, "rb") as fp:
+        with open(file_path, "rb") as fp:
             idx = 0
             while data := fp.read(randomizer.randint(min_chunk_size, max_chunk_size)):
                 raw_chunks.append(Chunk(data, idx))
@@ -192,70 +343,212 @@ class LOLFile:
         :param seed: A valid seed for `random.Random`. If None, the seed is random
             based on the implementation of the `random` library.
         """
-        # The same seed will always lead to the same random outputs.
+        table = ChunkTable.from_sizes([len(chunk.data) for chunk in raw_chunks], seed)
+
+        # With the offsets of each correctly-ordered chunk known, write each chunk
+        # (and its "next" pointer) straight into its place in the output
+        output = bytearray(table.get_lol_size())
+        md5 = hashlib.md5()
+        for idx, chunk in enumerate(raw_chunks):
+            chunk.next = table.get_next_offset(idx)
+            chunk.is_final_chunk = chunk.next == 0
+
+            offset = table.physical_offsets[idx]
+            output[offset : offset + chunk.get_full_length()] = chunk.as_bytes()
+            md5.update(chunk.data)
+
+        # Fill in the header
+        original_len = table.logical_offsets[-1] + table.sizes[-1]
+        output[0 : cls.SIZE_FILE_LENGTH] = original_len.to_bytes(
+            cls.SIZE_FILE_LENGTH, "big"
+        )
+        output[cls.SIZE_FILE_LENGTH : cls.SIZE_FILE_LENGTH + cls.SIZE_MD5_LENGTH] = (
+            md5.digest()
+        )
+
+        return bytes(output)
+
+    @staticmethod
+    def get_chunk_sizes(
+        file_size: int, min_chunk_size: int, max_chunk_size: int, seed=None
+    ) -> array:
+        """
+        Compute the sizes of each chunk's `data` field for a file of `file_size`
+        bytes, without reading the file.
+
+        This consumes the randomizer in exactly the same way as
+        `get_raw_chunks_from_file`, so the same seed yields the same chunk sizes.
+
+        :param file_size: The length of the file to break into chunks.
+        :param min_chunk_size: The minimum size of the `data` field of a chunk.
+        :param max_chunk_size: The maximum size of the `data` field of a chunk.
+        :param seed: The seed to use when generating chunk sizes.
+        :returns: A list of chunk data lengths, in sequential order.
+        """
+        if max_chunk_size < min_chunk_size:
+            raise ValueError("Max raw chunk size is smaller than min raw chunk size")
+
         randomizer = random.Random(seed)
 
-        # Create a dictionary from the raw chunks, so that we know the original
-        # order of the chunks.
-        chunk_indexes = {idx: chunk for idx, chunk in enumerate(raw_chunks)}
+        sizes = array("Q")
+        remaining = file_size
+        while remaining > 0:
+            size = min(randomizer.randint(min_chunk_size, max_chunk_size), remaining)
+            sizes.append(size)
+            remaining -= size
 
-        # Randomize the order of the chunks (note that shuffle() is in-place,
-        # which we don't want since we need the original chunks). Always
-        # keep the first "true" chunk first.
-        random_chunks: list[Chunk] = [raw_chunks[0]]
-        random_chunks += randomizer.sample(raw_chunks[1:], len(raw_chunks) - 1)
+        return sizes
 
-        # Calculate the offset of each ordered chunk into the resulting file.
-        random_offsets = {}
-        cur_offset = cls.SIZE_FILE_LENGTH + cls.SIZE_MD5_LENGTH
-        for chunk in random_chunks:
-            random_offsets[chunk.idx] = cur_offset
-            cur_offset += chunk.get_full_length()
-
-        # With the offsets of each correctly-ordered chunk known, now link up
-        # each chunk's "next" pointer
-        for chunk in random_chunks:
-            if chunk.idx + 1 not in random_offsets:
-                logger.debug(f"Assuming chunk ending in {chunk.data[-20:]} is the end")
-                chunk.next = 0
-            else:
-                chunk.next = random_offsets[chunk.idx + 1]
+    @classmethod
+    def write_from_file(
+        cls,
+        input_path: Path,
+        output_path: Path,
+        min_chunk_size: int,
+        max_chunk_size: int,
+        seed=None,
+    ) -> Tuple[int, bytes]:
+        """
+        Construct a .lol file from `input_path` and write it to `output_path`
+        without holding more than one chunk in memory at a time.
 
-        # Get the information we need for the header
-        raw_bytes = b"".join([chunk.data for chunk in raw_chunks])
-        original_len = len(raw_bytes)
-        md5_hash = hashlib.md5(raw_bytes).digest()
+        The chunk sizes and shuffled positions are computed from the size of the
+        input file alone. The input is then read sequentially, one chunk at a time,
+        and each chunk is written directly to its final position in the output.
+        The MD5 hash is computed along the way and written to the header last.
 
-        # Return full sequence of bytes
-        return (
-            original_len.to_bytes(cls.SIZE_FILE_LENGTH, "big")
-            + md5_hash
-            + b"".join([chunk.as_bytes() for chunk in random_chunks])
-        )
+        For the same seed, the result is byte-for-byte identical to writing out
+        `from_chunks(get_raw_chunks_from_file(...))`.
+
+        :param input_path: The path to the file to break into chunks.
+        :param output_path: The path to write the resulting .lol file to.
+        :param min_chunk_size: The minimum size of the `data` field of a chunk.
+        :param max_chunk_size: The maximum size of the `data` field of a chunk.
+        :param seed: The seed to use when generating chunk sizes and positions.
+        :returns: A tuple of the length and MD5 hash of the input file.
+        """
+        file_size = os.stat(input_path).st_size
+        sizes = cls.get_chunk_sizes(file_size, min_chunk_size, max_chunk_size, seed)
+        if not sizes:
+            raise ValueError(f"{input_path} is empty")
+
+        table = ChunkTable.from_sizes(sizes, seed)
+
+        md5 = hashlib.md5()
+        with open(input_path, "rb") as in_fp, open(output_path, "wb") as out_fp:
+            # Allocate the full file up front so that chunks can be written at
+            # their final offsets in any order.
+            lol_size = table.get_lol_size()
+            out_fp.truncate(lol_size)
+
+            for idx, size in enumerate(table.sizes):
+                data = in_fp.read(size)
+                if len(data) != size:
+                    raise RuntimeError(f"{input_path} changed size while reading")
+                md5.update(data)
+
+                next_offset = table.get_next_offset(idx)
+
+                out_fp.seek(table.physical_offsets[idx])
+                out_fp.write(size.to_bytes(Chunk.SIZE_CHUNK_LENGTH, "big"))
+                out_fp.write(data)
+                out_fp.write(next_offset.to_bytes(Chunk.SIZE_CHUNK_OFFSET, "big"))
+
+            md5_hash = md5.digest()
+            out_fp.seek(0)
+            out_fp.write(file_size.to_bytes(cls.SIZE_FILE_LENGTH, "big"))
+            out_fp.write(md5_hash)
+
+        logger.debug(f"Wrote {len(table)} chunks ({lol_size} bytes) to {output_path}")
+
+        return file_size, md5_hash
 
     @classmethod
-    def undo_lol_file(cls, lol_file: bytes) -> bytes:
+    def read_header(cls, lol_file: memoryview) -> Tuple[int, bytes]:
         """
-        Undo and verify a .lol file.
+        Return a tuple of the declared length and MD5 hash of the reconstructed
+        file from the header of a .lol file.
 
-        If the file fails the length and hash check, this raises RuntimeError.
+        If the file is too short to contain a header, or declares a length that
+        could not possibly fit in the file, this raises RuntimeError.
         """
-        len_bytes = int.from_bytes(lol_file[0:8], "big")
-        md5_bytes = lol_file[8:24]
+        header_size = cls.SIZE_FILE_LENGTH + cls.SIZE_MD5_LENGTH
+        if len(lol_file) < header_size:
+            raise RuntimeError(
+                f"File is too short to be a .lol file ({len(lol_file)} bytes)"
+            )
+
+        len_bytes = int.from_bytes(lol_file[0 : cls.SIZE_FILE_LENGTH], "big")
+        md5_bytes = bytes(lol_file[cls.SIZE_FILE_LENGTH : header_size])
 
-        reconstructed_data = b""
-        cur_offset = 24
+        # Each byte of the reconstructed file is stored exactly once, so the
+        # declared length can never exceed the size of the chunk section.
+        if len_bytes > len(lol_file) - header_size:
+            raise RuntimeError(
+                f"Declared length of {len_bytes} bytes is larger than the file"
+                f" itself ({len(lol_file)} bytes)"
+            )
+
+        return len_bytes, md5_bytes
+
+    @classmethod
+    def walk_chunks(cls, lol_file: memoryview) -> Iterator[Tuple[int, memoryview]]:
+        """
+        Follow the chunk pointers of a .lol file from the first chunk to the last.
+
+        Yields a tuple of the absolute offset of each chunk and a (zero-copy) view
+        of its data, in the order of the reconstructed file.
+
+        If a pointer leads outside of the file, back into the header, or to a chunk
+        that has already been visited, or if the chunks add up to more than the
+        declared length, this raises RuntimeError.
+        """
+        header_size = cls.SIZE_FILE_LENGTH + cls.SIZE_MD5_LENGTH
+        len_bytes, _ = cls.read_header(lol_file)
+
+        visited = set()
+        total_len = 0
+        cur_offset = header_size
         while True:
-            chunk_data, cur_offset = Chunk.get_next_chunk_data(lol_file, cur_offset)
-            reconstructed_data += chunk_data
+            if cur_offset in visited:
+                raise RuntimeError(f"Chunk at offset {cur_offset} forms a cycle")
+            visited.add(cur_offset)
+
+            chunk_data, next_offset = Chunk.get_next_chunk_data(lol_file, cur_offset)
+
+            total_len += len(chunk_data)
+            if total_len > len_bytes:
+                raise RuntimeError(
+                    f"Chunks exceed the declared length of {len_bytes} bytes"
+                )
+
+            yield cur_offset, chunk_data
+
             # If pointer is "null"
-            if cur_offset == 0:
+            if next_offset == 0:
                 break
 
-        # Do verification step
-        reconstructed_hash = hashlib.md5(reconstructed_data).digest()
-        reconstructed_len = len(reconstructed_data)
+            if next_offset < header_size or next_offset >= len(lol_file):
+                raise RuntimeError(
+                    f"Chunk at offset {cur_offset} points outside of the chunk"
+                    f" section (to offset {next_offset})"
+                )
+
+            cur_offset = next_offset
 
+    @staticmethod
+    def check_reconstructed(
+        reconstructed_hash: bytes,
+        reconstructed_len: int,
+        md5_bytes: bytes,
+        len_bytes: int,
+    ) -> None:
+        """
+        Check the hash and length of a reconstructed file against the ones that
+        were expected.
+
+        If either check fails, this raises RuntimeError.
+        """
         if reconstructed_hash == md5_bytes:
             logger.debug(
                 f"Hash check ok (got {reconstructed_hash.hex()}, expected"
@@ -279,17 +572,572 @@ class LOLFile:
                 f" {len_bytes} bytes)"
             )
 
+    @classmethod
+    def undo_lol_file(cls, lol_file: bytes) -> bytearray:
+        """
+        Undo and verify a .lol file.
+
+        `lol_file` may be any bytes-like object, such as `bytes`, a memoryview or
+        an mmap. Chunks are copied straight from it into a buffer preallocated to
+        the declared length, and hashed as they are copied.
+
+        If the file is malformed or fails the length and hash check, this raises
+        RuntimeError.
+        """
+        with memoryview(lol_file) as view:
+            len_bytes, md5_bytes = cls.read_header(view)
+
+            reconstructed_data = bytearray(len_bytes)
+            md5 = hashlib.md5()
+            reconstructed_len = 0
+            for _, chunk_data in cls.walk_chunks(view):
+                next_len = reconstructed_len + len(chunk_data)
+                reconstructed_data[reconstructed_len:next_len] = chunk_data
+                md5.update(chunk_data)
+                reconstructed_len = next_len
+
+                # Drop the reference to the slice so that `view` can be released
+                chunk_data.release()
+
+        cls.check_reconstructed(md5.digest(), reconstructed_len, md5_bytes, len_bytes)
+
         return reconstructed_data
 
+    @classmethod
+    def undo_lol_path(cls, file_path: Path) -> bytearray:
+        """
+        Undo and verify the .lol file at `file_path`.
+
+        The file is memory-mapped rather than read, so only the reconstructed file
+        is held in memory.
+        """
+        with open(file_path, "rb") as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                # mmap refuses to map empty files
+                return cls.undo_lol_file(b"")
+
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return cls.undo_lol_file(mm)
+
+    @classmethod
+    def verify_lol_path(
+        cls,
+        file_path: Path,
+        expected_md5: Optional[bytes] = None,
+        reconstructed_path: Optional[Path] = None,
+    ) -> Tuple[int, bytes]:
+        """
+        Verify the .lol file at `file_path` without reconstructing it in memory.
+
+        The file is memory-mapped, and each chunk is hashed as the pointers are
+        followed. If `reconstructed_path` is set, each chunk is also written out to
+        it, so the reconstructed file never has to be held in memory either.
+
+        If the file is malformed or fails the length and hash check, this raises
+        RuntimeError.
+
+        :param file_path: The path to the .lol file.
+        :param expected_md5: The hash that the reconstructed file should have, such
+            as the one returned by `write_from_file`. This is checked in addition
+            to the hash in the header of the .lol file.
+        :param reconstructed_path: Where to write the reconstructed file, if
+            anywhere.
+        :returns: A tuple of the length and MD5 hash of the reconstructed file.
+        """
+        with contextlib.ExitStack() as stack:
+            fp = stack.enter_context(open(file_path, "rb"))
+            if os.fstat(fp.fileno()).st_size == 0:
+                # mmap refuses to map empty files
+                lol_file = b""
+            else:
+                lol_file = stack.enter_context(
+                    mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                )
+
+            out_fp = None
+            if reconstructed_path is not None:
+                out_fp = stack.enter_context(open(reconstructed_path, "wb"))
+
+            with memoryview(lol_file) as view:
+                len_bytes, md5_bytes = cls.read_header(view)
+
+                md5 = hashlib.md5()
+                reconstructed_len = 0
+                for _, chunk_data in cls.walk_chunks(view):
+                    md5.update(chunk_data)
+                    if out_fp is not None:
+                        out_fp.write(chunk_data)
+                    reconstructed_len += len(chunk_data)
+
+                    # Drop the reference to the slice so that `view` can be released
+                    chunk_data.release()
+
+        reconstructed_hash = md5.digest()
+        cls.check_reconstructed(
+            reconstructed_hash, reconstructed_len, md5_bytes, len_bytes
+        )
+
+        if expected_md5 is not None and expected_md5 != reconstructed_hash:
+            raise RuntimeError(
+                f"Hash verify step failed (got {reconstructed_hash.hex()}, but"
+                f" expected {expected_md5.hex()})"
+            )
+
+        return reconstructed_len, reconstructed_hash
+
+
+class LOLIndex:
+    """
+    An index of the chunks in a .lol file, in the order of the reconstructed file.
+
+    The chunks themselves are described by a `ChunkTable`, alongside the header of
+    the indexed file. The header only describes the reconstructed file, so the size
+    and modification time of the .lol file are kept too; the same input chunked
+    with a different seed has the same header, but a different layout.
+
+    Format, when saved to disk:
+    - magic bytes (4 bytes, "LOLI")
+    - number of chunks (8 bytes, BE unsigned int)
+    - header of the indexed .lol file (length and MD5, 24 bytes)
+    - size and modification time (in nanoseconds) of the indexed .lol file (8
+    bytes each, BE unsigned ints)
+    - the chunk sizes, logical offsets and physical offsets, each as an array of
+    8-byte BE unsigned ints
+    """
+
+    MAGIC = b"LOLI"
+    SIZE_COUNT = 8
+    SIZE_STAT = 8
+    SIZE_ENTRY = 8
+
+    def __init__(
+        self,
+        len_bytes: int,
+        md5_bytes: bytes,
+        table: ChunkTable,
+        lol_size: int = 0,
+        lol_mtime_ns: int = 0,
+    ):
+        """
+        Create an index from an (already populated) chunk table.
+
+        :param len_bytes: The declared length of the reconstructed file.
+        :param md5_bytes: The declared MD5 hash of the reconstructed file.
+        :param table: The chunks of the file, in the order of the reconstructed
+            file.
+        :param lol_size: The size of the indexed .lol file.
+        :param lol_mtime_ns: The modification time of the indexed .lol file, in
+            nanoseconds.
+        """
+        self.len_bytes: int = len_bytes
+        self.md5_bytes: bytes = md5_bytes
+        self.table: ChunkTable = table
+        self.lol_size: int = lol_size
+        self.lol_mtime_ns: int = lol_mtime_ns
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @staticmethod
+    def get_index_path(lol_path: Path) -> Path:
+        """
+        Get the default path of the index for the .lol file at `lol_path`, which
+        is the same path with .idx tacked onto the end.
+        """
+        return lol_path.with_name(lol_path.name + ".idx")
+
+    @classmethod
+    def build(cls, lol_file: memoryview) -> "LOLIndex":
+        """
+        Build an index by following the chunk pointers of a .lol file once.
+
+        This raises RuntimeError under the same conditions as
+        `LOLFile.walk_chunks`.
+        """
+        len_bytes, md5_bytes = LOLFile.read_header(lol_file)
+
+        table = ChunkTable()
+
+        logical_offset = 0
+        for chunk_offset, chunk_data in LOLFile.walk_chunks(lol_file):
+            table.append(len(chunk_data), logical_offset, chunk_offset)
+
+            logical_offset += len(chunk_data)
+            chunk_data.release()
+
+        logger.debug(f"Indexed {len(table)} chunks")
+
+        return cls(len_bytes, md5_bytes, table, len(lol_file))
+
+    def check(self, lol_file: memoryview) -> None:
+        """
+        Check that this index describes the chunk layout of `lol_file`, without
+        walking the chunk pointers: every chunk has to be inside the file, with
+        the length and `next` pointer that the index says it has.
+
+        If it doesn't, this raises RuntimeError.
+        """
+        len_bytes, md5_bytes = LOLFile.read_header(lol_file)
+        if (len_bytes, md5_bytes) != (self.len_bytes, self.md5_bytes):
+            raise RuntimeError("Index header doesn't match the .lol file")
+
+        table = self.table
+        for idx in range(len(table)):
+            offset = table.physical_offsets[idx]
+            size = table.sizes[idx]
+            end = offset + size + Chunk.SIZE_CHUNK_OVERHEAD
+            if end > len(lol_file):
+                raise RuntimeError(f"Indexed chunk at {offset} is outside the file")
+
+            chunk_len = int.from_bytes(
+                lol_file[offset : offset + Chunk.SIZE_CHUNK_LENGTH], "big"
+            )
+            next_offset = int.from_bytes(
+                lol_file[end - Chunk.SIZE_CHUNK_OFFSET : end], "big"
+            )
+            if chunk_len != size or next_offset != table.get_next_offset(idx):
+                raise RuntimeError(f"Indexed chunk at {offset} doesn't match the file")
+
+    @classmethod
+    def load(
+        cls, index_path: Path, lol_file: Optional[memoryview] = None
+    ) -> "LOLIndex":
+        """
+        Load an index previously written with `save`.
+
+        If the file isn't a valid index, or `lol_file` is given and the index
+        doesn't match it (see `check`), this raises RuntimeError.
+        """
+        with open(index_path, "rb") as fp:
+            data = fp.read()
+
+        header_size = (
+            len(cls.MAGIC)
+            + cls.SIZE_COUNT
+            + LOLFile.SIZE_FILE_LENGTH
+            + LOLFile.SIZE_MD5_LENGTH
+            + 2 * cls.SIZE_STAT
+        )
+        if data[: len(cls.MAGIC)] != cls.MAGIC or len(data) < header_size:
+            raise RuntimeError(f"{index_path} is not a .lol index")
+
+        cur_offset = len(cls.MAGIC)
+        count = int.from_bytes(data[cur_offset : cur_offset + cls.SIZE_COUNT], "big")
+        cur_offset += cls.SIZE_COUNT
+        len_bytes = int.from_bytes(
+            data[cur_offset : cur_offset + LOLFile.SIZE_FILE_LENGTH], "big"
+        )
+        cur_offset += LOLFile.SIZE_FILE_LENGTH
+        md5_bytes = data[cur_offset : cur_offset + LOLFile.SIZE_MD5_LENGTH]
+        cur_offset += LOLFile.SIZE_MD5_LENGTH
+        lol_size = int.from_bytes(data[cur_offset : cur_offset + cls.SIZE_STAT], "big")
+        cur_offset += cls.SIZE_STAT
+        lol_mtime_ns = int.from_bytes(
+            data[cur_offset : cur_offset + cls.SIZE_STAT], "big"
+        )
+        cur_offset += cls.SIZE_STAT
+
+        if len(data) != header_size + 3 * count * cls.SIZE_ENTRY:
+            raise RuntimeError(f"{index_path} is truncated")
+
+        arrays = []
+        for _ in range(3):
+            entries = array("Q")
+            entries.frombytes(data[cur_offset : cur_offset + count * cls.SIZE_ENTRY])
+            if sys.byteorder == "little":
+                entries.byteswap()
+            arrays.append(entries)
+            cur_offset += count * cls.SIZE_ENTRY
+
+        index = cls(len_bytes, md5_bytes, ChunkTable(*arrays), lol_size, lol_mtime_ns)
+        if lol_file is not None:
+            index.check(lol_file)
+
+        return index
+
+    def save(self, index_path: Path) -> None:
+        """
+        Write this index to `index_path`.
+        """
+        with open(index_path, "wb") as fp:
+            fp.write(self.MAGIC)
+            fp.write(len(self).to_bytes(self.SIZE_COUNT, "big"))
+            fp.write(self.len_bytes.to_bytes(LOLFile.SIZE_FILE_LENGTH, "big"))
+            fp.write(self.md5_bytes)
+            fp.write(self.lol_size.to_bytes(self.SIZE_STAT, "big"))
+            fp.write(self.lol_mtime_ns.to_bytes(self.SIZE_STAT, "big"))
+
+            for entries in (
+                self.table.sizes,
+                self.table.logical_offsets,
+                self.table.physical_offsets,
+            ):
+                if sys.byteorder == "little":
+                    entries = array("Q", entries)
+                    entries.byteswap()
+                fp.write(entries.tobytes())
+
+    @classmethod
+    def from_lol_file(
+        cls, lol_file: memoryview, lol_path: Path, persist: bool = False
+    ) -> "LOLIndex":
+        """
+        Get the index for the .lol file at `lol_path`, whose contents are
+        `lol_file`.
+
+        If an index already exists next to the file, was made from a file of the
+        same size and modification time, and matches its chunk layout (see
+        `check`), it is loaded instead of following the chunk pointers again.
+        Otherwise, the index is built, and saved next to the file if `persist` is
+        set.
+        """
+        index_path = cls.get_index_path(lol_path)
+        stat = lol_path.stat()
+
+        if index_path.exists():
+            try:
+                index = cls.load(index_path)
+                if (index.lol_size, index.lol_mtime_ns) != (
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                ):
+                    raise RuntimeError("Index was made from a different .lol file")
+                index.check(lol_file)
+            except RuntimeError as e:
+                logger.debug(f"Ignoring stale or invalid index {index_path}: {e}")
+            else:
+                logger.debug(f"Loaded index from {index_path}")
+                return index
+
+        index = cls.build(lol_file)
+        index.lol_mtime_ns = stat.st_mtime_ns
+        if persist:
+            index.save(index_path)
+            logger.debug(f"Saved index to {index_path}")
+
+        return index
+
+    def find_chunk(self, pos: int) -> int:
+        """
+        Return the position in the index of the chunk containing the byte at
+        offset `pos` of the reconstructed file.
+        """
+        return bisect.bisect_right(self.table.logical_offsets, pos) - 1
+
+
+class LOLReader(io.RawIOBase):
+    """
+    A read-only, seekable file-like object over the reconstructed contents of a
+    .lol file.
+
+    Reads are served straight out of a memory map of the .lol file using an
+    `LOLIndex`, so reading from anywhere in the reconstructed file only costs a
+    binary search over the chunks. Note that the hash of the reconstructed file
+    isn't checked.
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        index: Optional[LOLIndex] = None,
+        persist_index: bool = False,
+    ):
+        """
+        Open the .lol file at `file_path` for reading.
+
+        :param file_path: The path to the .lol file.
+        :param index: The index of the file. If None, it is loaded from next to
+            the file or built, as in `LOLIndex.from_lol_file`.
+        :param persist_index: Whether to save a newly-built index next to the file.
+        """
+        super().__init__()
+
+        self._fp = open(file_path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+            if index is None:
+                index = LOLIndex.from_lol_file(self._view, file_path, persist_index)
+        except:
+            self.close()
+            raise
+
+        self.index: LOLIndex = index
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        self._checkClosed()
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.index.len_bytes + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+
+        self._pos = pos
+        return self._pos
+
+    def readinto(self, b) -> int:
+        self._checkClosed()
+        with memoryview(b) as out:
+            out = out.cast("B")
+            total = 0
+            if self._pos >= self.index.len_bytes or len(out) == 0:
+                return 0
+
+            table = self.index.table
+            idx = self.index.find_chunk(self._pos)
+            while total < len(out) and idx < len(table):
+                chunk_pos = self._pos - table.logical_offsets[idx]
+                count = min(table.sizes[idx] - chunk_pos, len(out) - total)
+
+                physical_offset = table.get_data_offset(idx) + chunk_pos
+                out[total : total + count] = self._view[
+                    physical_offset : physical_offset + count
+                ]
+
+                total += count
+                self._pos += count
+                idx += 1
+
+        return total
+
+    def close(self) -> None:
+        if not self.closed:
+            if hasattr(self, "_view"):
+                self._view.release()
+            if hasattr(self, "_mmap"):
+                self._mmap.close()
+            self._fp.close()
+        super().close()
+
+
+def read_manifest(manifest_path: Path) -> List[Tuple[str, Path, str]]:
+    """
+    Read a batch manifest.
+
+    The manifest is a CSV file with the header `team_id,input_file,seed`. Input
+    files are relative to the manifest's directory. An empty seed is replaced
+    with a new random one, so that every team's file can be made again from the
+    summary.
+
+    If a column is missing, or a team ID is invalid or repeated, this raises
+    ValueError.
+
+    :returns: A list of (team id, input file, seed) tuples.
+    """
+    teams = []
+    with open(manifest_path, newline="") as fp:
+        reader = csv.DictReader(fp)
+        missing = [
+            column
+            for column in ("team_id", "input_file", "seed")
+            if column not in (reader.fieldnames or [])
+        ]
+        if missing:
+            raise ValueError(
+                f"{manifest_path} is missing the column(s) {', '.join(missing)}"
+            )
+
+        for row in reader:
+            if not TEAM_ID_PATTERN.fullmatch(row["team_id"]):
+                raise ValueError(f"{row['team_id']!r} isn't a valid team ID")
+
+            teams.append(
+                (
+                    row["team_id"],
+                    manifest_path.parent / row["input_file"],
+                    row["seed"] or secrets.token_hex(16),
+                )
+            )
+
+    team_ids = [team_id for team_id, _, _ in teams]
+    if len(set(team_ids)) != len(team_ids):
+        raise ValueError(f"{manifest_path} contains duplicate team IDs")
+
+    return teams
+
+
+def make_team_file(
+    team_id: str,
+    input_file: Path,
+    output_file: Path,
+    min_chunk_size: int,
+    max_chunk_size: int,
+    seed: str,
+) -> dict:
+    """
+    Create and verify a single team's .lol file.
+
+    This runs in a worker process during batch generation. If anything fails,
+    the partial file (and the team's directory, if this created it) is removed.
+
+    :returns: A summary of the created file, suitable for dumping to JSON.
+    """
+    created_dir = not output_file.parent.exists()
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    try:
+        start = time.perf_counter()
+        file_size, md5_hash = LOLFile.write_from_file(
+            input_file, output_file, min_chunk_size, max_chunk_size, seed
+        )
+        generate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        LOLFile.verify_lol_path(output_file, md5_hash)
+        verify_time = time.perf_counter() - start
+    except BaseException:
+        output_file.unlink(missing_ok=True)
+        if created_dir:
+            with contextlib.suppress(OSError):
+                output_file.parent.rmdir()
+        raise
+
+    return {
+        "team_id": team_id,
+        "input_file": str(input_file),
+        "output_file": str(output_file),
+        "seed": seed,
+        "length": file_size,
+        "md5": md5_hash.hex(),
+        "generate_seconds": round(generate_time, 6),
+        "verify_seconds": round(verify_time, 6),
+    }
+
 
 def get_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Creates and verifies .lol files.")
-    parser.add_argument(
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
         "--input-file",
         default=DEFAULT_INPUT_FILE,
         type=Path,
         help="The file to convert into a .lol file.",
-        required=True,
+    )
+    source.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        help=(
+            "A CSV file with the columns team_id, input_file and seed. Creates one"
+            " .lol file per team, in parallel, instead of a single .lol file."
+        ),
     )
     parser.add_argument(
         "--output-file",
@@ -330,22 +1178,119 @@ def get_args() -> argparse.Namespace:
         ),
     )
 
+    parser.add_argument(
+        "--write-reconstructed",
+        action="store_true",
+        help=(
+            "Also write the file reconstructed from the .lol file during"
+            " verification, as the input file's stem with -reconstructed added."
+        ),
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=None,
+        help=(
+            "With --manifest, the directory to write each team's .lol file to, as"
+            " <output-dir>/<team_id>/<input stem>.lol. Defaults to the manifest's"
+            " directory."
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="With --manifest, the number of worker processes. Defaults to one per CPU.",
+    )
+    parser.add_argument(
+        "--summary",
+        type=Path,
+        default=None,
+        help=(
+            "With --manifest, the path to write the JSON summary of hashes and"
+            " timings to. Defaults to summary.json in the output directory."
+        ),
+    )
+
     return parser.parse_args()
 
 
+def main_batch(args: argparse.Namespace) -> None:
+    try:
+        teams = read_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        logger.error(e)
+        exit(1)
+    seeds = {team_id: seed for team_id, _, seed in teams}
+    output_dir = args.output_dir or args.manifest.parent
+    summary_path = args.summary or output_dir / "summary.json"
+
+    logger.info(f"Creating .lol files for {len(teams)} teams in {output_dir}")
+
+    start = time.perf_counter()
+    results = {}
+    failed = False
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {
+            executor.submit(
+                make_team_file,
+                team_id,
+                input_file,
+                output_dir / team_id / input_file.with_suffix(".lol").name,
+                args.min_chunk_size,
+                args.max_chunk_size,
+                seed,
+            ): team_id
+            for team_id, input_file, seed in teams
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            team_id = futures[future]
+            try:
+                results[team_id] = future.result()
+            except Exception as e:
+                logger.error(f"Failed to create .lol file for team {team_id}: {e}")
+                results[team_id] = {
+                    "team_id": team_id,
+                    "seed": seeds[team_id],
+                    "error": str(e),
+                }
+                failed = True
+            else:
+                logger.debug(f"Created {results[team_id]['output_file']}")
+
+    total_time = time.perf_counter() - start
+
+    # Keep the summary in manifest order, regardless of completion order
+    summary = {
+        "total_seconds": round(total_time, 6),
+        "teams": [results[team_id] for team_id, _, _ in teams],
+    }
+
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(summary_path, "w") as fp:
+        json.dump(summary, fp, indent=2)
+
+    logger.info(f"Wrote summary to {summary_path} ({round(total_time, 3)}s total)")
+
+    if failed:
+        logger.error("Some .lol files failed to generate or verify")
+        exit(1)
+
+    logger.info("OK")
+
+
 def main(args: argparse.Namespace) -> None:
+    if args.manifest is not None:
+        main_batch(args)
+        return
+
     if args.seed is not None:
         logger.debug(f"Using seed {args.seed}")
     else:
         logger.debug(f"No seed specified, using random seed")
 
-    # Parse file into chunks, then pass them into LOLFile's method to convert it
-    # to the "random" format
-    raw_chunks = LOLFile.get_raw_chunks_from_file(
-        args.input_file, args.min_chunk_size, args.max_chunk_size, args.seed
-    )
-    lol_file = LOLFile.from_chunks(raw_chunks, args.seed)
-
     # If no output file has been defined, just use the input filepath but with
     # .lol instead
     if not args.output_file:
@@ -353,38 +1298,36 @@ def main(args: argparse.Namespace) -> None:
 
     logger.info(f"Writing resulting file to {args.output_file}")
 
-    # Write back out to file
-    with open(args.output_file, "wb") as fp:
-        fp.write(lol_file)
-
-    # Reconstruct the file as a sanity check
-    with open(args.output_file, "rb") as fp:
-        try:
-            reconstructed_data = LOLFile.undo_lol_file(fp.read())
-        except:
-            logger.exception("File-internal verify step failed")
-            raise
+    # Break the file into chunks and write them out in the "random" format, one
+    # chunk at a time. This also gives us the hash of the input file.
+    _, md5_hash = LOLFile.write_from_file(
+        args.input_file,
+        args.output_file,
+        args.min_chunk_size,
+        args.max_chunk_size,
+        args.seed,
+    )
 
-    # Throw out the reconstructed file, just to verify. The default path is just
+    # Optionally throw out the reconstructed file, too. The default path is just
     # the input path with "-reconstructed" added onto its stem. Note that I use
     # with_name instead of with_stem for compatibility reasons.
-    reconstructed_path = args.input_file.with_name(
-        args.input_file.stem + "-reconstructed" + args.input_file.suffix
-    )
-    with open(reconstructed_path, "wb") as fp2:
-        fp2.write(reconstructed_data)
-
-    # Check if the file is still the same way going out as it was coming in
-    with open(Path(args.input_file), "rb") as fp:
-        old_hash = hashlib.md5(fp.read()).digest()
-
-    new_hash = hashlib.md5(reconstructed_data).digest()
-    if new_hash == old_hash:
-        logger.info("OK")
-    else:
-        logger.error("Hash verify step failed")
+    reconstructed_path = None
+    if args.write_reconstructed:
+        reconstructed_path = args.input_file.with_name(
+            args.input_file.stem + "-reconstructed" + args.input_file.suffix
+        )
+        logger.info(f"Writing reconstructed file to {reconstructed_path}")
+
+    # Reconstruct the file as a sanity check, making sure that it's still the same
+    # way going out as it was coming in
+    try:
+        LOLFile.verify_lol_path(args.output_file, md5_hash, reconstructed_path)
+    except RuntimeError:
+        logger.exception("File-internal verify step failed")
         exit(1)
 
+    logger.info("OK")
+
 
 if __name__ == "__main__":
     # Parse arguments